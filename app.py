@@ -1,14 +1,104 @@
+import os
+from functools import partial
+
 from dotenv import dotenv_values
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from util.logging import configure_logging, logger
+from util.password_util import DEFAULT_ROUNDS
 
-app = Flask(__name__)
+# bound to an application by create_app(), models and DAOs only need it inside an app context
+db = SQLAlchemy()
+session = db.session
 
-config = dotenv_values(".env")
+# .env key -> (Flask config key, type, default)
+SETTINGS = {
+    'db.uri': ('SQLALCHEMY_DATABASE_URI', str, None),
+    'log.file': ('LOG_FILE', str, 'app.log'),
+    # number of proxies (e.g. the load balancer) in front of the app whose X-Forwarded-* headers are trusted, 0 when
+    # the app is exposed directly, otherwise clients could spoof their address
+    'proxy.trusted.hops': ('PROXY_TRUSTED_HOPS', int, 0),
+    'violations.limit': ('VIOLATIONS_LIMIT_PER_EXAM', int, 3),
+    # identical violation events within the window count once, 0 disables
+    'violations.debounce.seconds': ('VIOLATIONS_DEBOUNCE_WINDOW', float, 2),
+    # look up the recent violations in the database as well, for events of a student spread across workers
+    'violations.debounce.shared': ('VIOLATIONS_DEBOUNCE_SHARED', lambda value: value.lower() == 'true', False),
+    'minerva.url': ('MINERVA_URL', str, 'http://localhost:9091'),
+    'minerva.poll.interval': ('SUBMISSION_POLL_INTERVAL', float, 2),
+    'minerva.callback.secret': ('MINERVA_CALLBACK_SECRET', str, None),
+    'minerva.max.concurrency': ('MINERVA_MAX_CONCURRENCY', int, 8),
+    'admission.max.in.flight': ('MAX_IN_FLIGHT_REQUESTS', int, 64),
+    'exam.scheduler.interval': ('EXAM_SCHEDULER_INTERVAL', float, 30),
+    'exam.warm.up.minutes': ('EXAM_WARM_UP_WINDOW', float, 10),
+    'compression.min.size': ('COMPRESSION_MIN_SIZE', int, 1024),
+    'submission.max.size': ('MAX_SUBMISSION_SIZE', int, 2 * 1024 * 1024),
+    'archive.dir': ('ARCHIVE_DIR', str, 'archive'),
+    'archive.after.days': ('ARCHIVE_AFTER_DAYS', float, 30),
+    # calibrated with calibrate_password_cost.py
+    'password.bcrypt.rounds': ('PASSWORD_ROUNDS', int, DEFAULT_ROUNDS),
+    # an empty journal.dir writes straight to the database
+    'journal.dir': ('JOURNAL_DIR', str, 'journal'),
+    'journal.segment.size': ('JOURNAL_SEGMENT_SIZE', int, 16 * 1024 * 1024),
+    'journal.fsync.delay': ('JOURNAL_FSYNC_DELAY', float, 0.002),
+    'journal.replay.interval': ('JOURNAL_REPLAY_INTERVAL', float, 1),
+    'health.probe.timeout': ('HEALTH_PROBE_TIMEOUT', float, 1),
+    'health.cache.seconds': ('HEALTH_CACHE_TTL', float, 2),
+}
 
-app.config["SQLALCHEMY_DATABASE_URI"] = config.get('db.uri')
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-violations_limit_per_exam = config.get('violations.limit')
 
-db = SQLAlchemy(app)
-session = db.session
+def load_config(path='.env'):
+    values = dotenv_values(path)
+    config = {}
+    for name, (key, cast, default) in SETTINGS.items():
+        value = values.get(name)
+        config[key] = cast(value) if value is not None else default
+    return config
+
+
+# The application is assembled here instead of on import, so importing a module never reads .env, opens the log file
+# or builds a client. The services behind the routes are built on first use by each worker (see server.Services).
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update({key: default for key, _, default in SETTINGS.values()})
+    app.config.update(load_config() if config is None else config)
+
+    hops = app.config['PROXY_TRUSTED_HOPS']
+    if hops:
+        # request.remote_addr is the client address then, the rate limits are keyed on it
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+    if app.config['LOG_FILE']:
+        configure_logging(app.config['LOG_FILE'])
+    db.init_app(app)
+
+    import server
+    server.init_app(app)
+
+    # a forked worker must not reuse the connections and threads of its parent
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=partial(post_fork, app))
+    return app
+
+
+# Pre-fork hook, e.g. from gunicorn --preload: fills the caches once in the master so every worker inherits them.
+def warm_up(app):
+    import server
+    with app.app_context():
+        try:
+            server.warm_up()
+        except Exception as e:
+            logger.error(f'Warm up failed: {e}')
+        # the pooled connections used for the warm up must not be shared with the workers
+        db.engine.dispose()
+
+
+# Post-fork hook, runs in every forked worker
+def post_fork(app):
+    import server
+    with app.app_context():
+        # close=False leaves the parent's sockets alone, the child only drops its references to them
+        db.engine.dispose(close=False)
+        server.get_services().reset_after_fork()
@@ -1,16 +1,24 @@
+import enum
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 
 from uuid import uuid4
-from base64 import b64encode, b64decode
+from base64 import b64encode
 
-from json import loads, dumps
+from json import dumps
 
 from exception import UNAUTHORIZED
 
 
 def get_time_with_offset_in_minutes(offset_in_minutes):
-    return datetime.isoformat(datetime.utcnow() + timedelta(minutes=offset_in_minutes))
+    return datetime.utcnow() + timedelta(minutes=offset_in_minutes)
+
+
+class AuthPolicy(enum.Enum):
+    PUBLIC = 'PUBLIC'
+    ANY = 'ANY'
+    STAFF = 'STAFF'
+    STUDENT = 'STUDENT'
 
 
 class AuthManager:
@@ -19,26 +27,26 @@ class AuthManager:
         self._credentials = {}
 
     def create_token(self, user):
+        exp = get_time_with_offset_in_minutes(self._token_expiration_offset_in_minutes)
         payload = dumps({
             'id': user.id,
             'email': user.email,
             'role': user.role.value,
-            'exp': get_time_with_offset_in_minutes(self._token_expiration_offset_in_minutes),
+            'exp': datetime.isoformat(exp),
             'salt': str(uuid4())
         }).encode('utf-8')
 
         token = b64encode(payload).decode('utf-8')
-        self._credentials[token] = UserContext(user.id, user.email, user.role)
+        # the expiration is kept next to the user, so the token never has to be decoded again
+        self._credentials[token] = (UserContext(user.id, user.email, user.role), exp)
         return token
 
     def get_user(self, token):
-        user = self._credentials.get(token)
-        if not user:
+        credentials = self._credentials.get(token)
+        if not credentials:
             raise UNAUTHORIZED
 
-        decoded_token = self._decode_token(token)
-        exp = decoded_token.get("exp")
-
+        user, exp = credentials
         if self._is_token_expired(exp):
             self._credentials.pop(token, None)
             raise UNAUTHORIZED
@@ -48,14 +56,6 @@ class AuthManager:
     def invalidate_token(self, token):
         self._credentials.pop(token, None)
 
-    def _decode_token(self, token):
-        if not token:
-            raise ValueError('Missing token')
-
-        decoded_token = loads(b64decode(token).decode("utf-8"))
-        decoded_token["exp"] = datetime.fromisoformat(decoded_token["exp"])
-        return decoded_token
-
     def _is_token_expired(self, expiration_time):
         return datetime.utcnow() >= expiration_time
 
@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+from argparse import ArgumentParser
+from base64 import b64decode
+from datetime import datetime
+from timeit import repeat
+
+from flask import request, g
+
+from benchmark import fixtures
+
+REPEATS = 5
+
+
+def measure(iterations):
+    # create_app() resolves .env (and the log file) relative to the cwd, nothing here touches the database
+    workdir = tempfile.mkdtemp(prefix='hogwarts-auth-bench-')
+    fixtures.write_env(workdir, f'sqlite:///{os.path.join(workdir, "bench.db")}', 3)
+    os.chdir(workdir)
+
+    import server
+    from app import create_app
+    from exception import UNAUTHORIZED
+    from model import Staff
+
+    app = create_app()
+    app.app_context().push()
+    auth_manager = server.get_services().auth_manager
+
+    staff = Staff(id=1, email=fixtures.STAFF_EMAIL)
+    token = auth_manager.create_token(staff)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    # the path before the compiled policies: the whitelist was scanned for every request, then the decorator and every
+    # get_identity() call looked the token up and decoded it again to check its expiration
+    whitelisted_urls = ['/api/v1/auth', '/api/v1/minerva/submissions/callback']
+
+    def legacy_get_user(legacy_token):
+        if legacy_token not in credentials:
+            raise UNAUTHORIZED
+        exp = datetime.fromisoformat(json.loads(b64decode(legacy_token).decode('utf-8'))['exp'])
+        if datetime.utcnow() >= exp:
+            raise UNAUTHORIZED
+        return credentials[legacy_token][0]
+
+    def legacy_authenticate(lookups):
+        for url in whitelisted_urls:
+            if request.url.endswith(url):
+                return
+        authz_header = request.headers.get('Authorization')
+        g.token = authz_header[len(server.BEARER):] if authz_header and authz_header.startswith(server.BEARER) else None
+        legacy_get_user(g.token)
+        for _ in range(lookups):
+            legacy_get_user(g.token)
+
+    def authenticate(lookups):
+        server.authenticate()
+        for _ in range(lookups):
+            server.get_identity()
+
+    # the fastest of a few repeats, the slower ones measure the noise of the machine
+    def best(fn, number):
+        return min(repeat(fn, number=number, repeat=REPEATS))
+
+    credentials = auth_manager._credentials
+    # a single request context for all the iterations, so only the authentication itself is timed
+    with app.test_request_context('/api/v1/submissions', headers=headers):
+        results = {
+            'authenticate_us': best(lambda: authenticate(0), number=iterations),
+            'authenticate_and_3_lookups_us': best(lambda: authenticate(3), number=iterations),
+            'legacy_authenticate_us': best(lambda: legacy_authenticate(0), number=iterations),
+            'legacy_authenticate_and_3_lookups_us': best(lambda: legacy_authenticate(3), number=iterations),
+            'auth_manager_get_user_us': best(lambda: auth_manager.get_user(token), number=iterations),
+            'legacy_get_user_us': best(lambda: legacy_get_user(token), number=iterations),
+        }
+    return {name: round(1e6 * total / iterations, 3) for name, total in results.items()}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Measures the per-request overhead of authentication and authorization.')
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(json.dumps({'iterations': args.iterations, **measure(args.iterations)}, indent=2))
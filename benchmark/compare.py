@@ -0,0 +1,42 @@
+import json
+from argparse import ArgumentParser
+
+METRICS = ['p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'errors', 'rejected']
+
+
+def load_report(path):
+    with open(path, 'r') as fp:
+        return json.load(fp)
+
+
+def compare(baseline, candidate):
+    rows = []
+    for scenario, scenario_report in candidate['scenarios'].items():
+        baseline_endpoints = baseline['scenarios'].get(scenario, {}).get('endpoints', {})
+        for endpoint, stats in scenario_report['endpoints'].items():
+            baseline_stats = baseline_endpoints.get(endpoint)
+            if not baseline_stats:
+                continue
+            for metric in METRICS:
+                before, after = baseline_stats.get(metric), stats.get(metric)
+                rows.append((scenario, endpoint, metric, before, after, _change(before, after)))
+    return rows
+
+
+def _change(before, after):
+    if not before or after is None:
+        return None
+    return round(100 * (after - before) / before, 1)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Compares two benchmark reports produced by benchmark.run.')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args()
+
+    baseline_report, candidate_report = load_report(args.baseline), load_report(args.candidate)
+    print(f'baseline: {baseline_report.get("commit")}, candidate: {candidate_report.get("commit")}')
+    for scenario, endpoint, metric, before, after, change in compare(baseline_report, candidate_report):
+        change_repr = f'{change:+.1f}%' if change is not None else 'n/a'
+        print(f'{scenario:<20} {endpoint:<65} {metric:<15} {str(before):>10} -> {str(after):>10} ({change_repr})')
@@ -0,0 +1,113 @@
+import gzip
+import json
+from argparse import ArgumentParser
+from itertools import count
+from threading import Lock
+from time import sleep, monotonic
+
+from flask import Flask, request
+
+app = Flask(__name__)
+app.config['LATENCY_IN_SECONDS'] = 0.01
+app.config['GRADING_TIME_IN_SECONDS'] = 2.0
+
+USER_HEADER = 'X-albus-user-id'
+
+_submission_ids = count(1)
+_submissions = {}
+_lock = Lock()
+
+
+def _simulate_latency():
+    latency = app.config['LATENCY_IN_SECONDS']
+    if latency:
+        sleep(latency)
+
+
+def _to_representation(submission):
+    graded = monotonic() - submission['submitted_at'] >= app.config['GRADING_TIME_IN_SECONDS']
+    return {
+        'id': submission['id'],
+        'assignmentId': submission['assignmentId'],
+        'examId': submission['examId'],
+        'userId': submission['userId'],
+        'status': 'GRADED' if graded else 'PENDING',
+        # deterministic score so that repeated runs produce the same results
+        'score': (submission['id'] * 37) % 101 if graded else None,
+    }
+
+
+@app.route('/api/v1/submissions', methods=['POST'])
+def submit():
+    _simulate_latency()
+    data = _read_payload()
+    with _lock:
+        submission_id = next(_submission_ids)
+        _submissions[submission_id] = {
+            'id': submission_id,
+            'assignmentId': data.get('assignmentId'),
+            'examId': data.get('examId'),
+            'userId': request.headers.get(USER_HEADER),
+            'submitted_at': monotonic(),
+        }
+    return _to_representation(_submissions[submission_id]), 202
+
+
+@app.route('/api/v1/submissions', methods=['GET'])
+def list_my_submissions():
+    _simulate_latency()
+    exam_id = request.args.get('examId')
+    user_id = request.headers.get(USER_HEADER)
+    with _lock:
+        submissions = [submission for submission in _submissions.values()
+                       if submission['userId'] == user_id and str(submission['examId']) == exam_id]
+    return {'submissions': [_to_representation(submission) for submission in _paginate(submissions)]}, 200
+
+
+@app.route('/api/v1/submissions/_all', methods=['GET'])
+def list_all_submissions():
+    _simulate_latency()
+    with _lock:
+        submissions = list(_submissions.values())
+    return {'submissions': [_to_representation(submission) for submission in _paginate(submissions)]}, 200
+
+
+@app.route('/api/v1/submissions/<int:submission_id>', methods=['GET'])
+def get_submission(submission_id):
+    _simulate_latency()
+    submission = _submissions.get(submission_id)
+    if not submission:
+        return {'error': 'Submission not found.'}, 404
+    return _to_representation(submission), 200
+
+
+@app.route('/api/v1/submissions/allowance', methods=['GET'])
+def get_allowance():
+    _simulate_latency()
+    return {'assignmentId': request.args.get('assignmentId'), 'remaining': 10}, 200
+
+
+def _read_payload():
+    if request.headers.get('Content-Encoding') == 'gzip':
+        return json.loads(gzip.decompress(request.get_data()))
+    return request.form or request.get_json(silent=True) or {}
+
+
+def _paginate(submissions):
+    page = int(request.args.get('page', 0))
+    size = int(request.args.get('size', 50))
+    return submissions[page * size:(page + 1) * size]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Minimal in-memory Minerva stand-in used by the benchmarks.')
+    parser.add_argument('--port', type=int, default=9091)
+    parser.add_argument('--latency', type=float, default=app.config['LATENCY_IN_SECONDS'],
+                        help='artificial latency added to every call, in seconds')
+    parser.add_argument('--grading-time', type=float, default=app.config['GRADING_TIME_IN_SECONDS'],
+                        help='seconds after which a submission is reported as graded')
+    args = parser.parse_args()
+
+    app.config['LATENCY_IN_SECONDS'] = args.latency
+    app.config['GRADING_TIME_IN_SECONDS'] = args.grading_time
+    app.run(port=args.port, threaded=True)
@@ -0,0 +1,90 @@
+import json
+import os
+import subprocess
+import sys
+from time import perf_counter, sleep
+
+from requests import get
+from requests.exceptions import RequestException
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STUDENT_PASSWORD = 'bench123'
+STAFF_EMAIL = 'staff@bench.local'
+STAFF_PASSWORD = 'bench123'
+COURSE_NAME = 'Benchmark course'
+
+RESET_SCHEMA = 'from app import db, create_app\ncreate_app().app_context().push()\ndb.drop_all()\ndb.create_all()\n'
+
+
+def student_identifier(index):
+    return f'bench-{index:06d}'
+
+
+def exam_description(index):
+    return f'Benchmark exam {index}'
+
+
+def write_resources(workdir, num_of_students, num_of_exams, assignments_per_exam, assignment_text_size):
+    resources_dir = os.path.join(workdir, 'resources')
+    os.makedirs(resources_dir, exist_ok=True)
+
+    resources = {
+        'environments': [{'name': 'python3.10', 'docker_image': 'python:3.10.14'}],
+        'staff': [{'first_name': 'Bench', 'last_name': 'Staff', 'email': STAFF_EMAIL, 'password': STAFF_PASSWORD}],
+        'students': [
+            {
+                'first_name': 'Bench',
+                'last_name': f'Student{i}',
+                'email': f'student{i}@bench.local',
+                'password': STUDENT_PASSWORD,
+                'identifier': student_identifier(i),
+            } for i in range(num_of_students)
+        ],
+        'courses': [{'name': COURSE_NAME}],
+        'exams': [
+            {'description': exam_description(i), 'status': 'ACTIVE', 'course_name': COURSE_NAME}
+            for i in range(num_of_exams)
+        ],
+        'assignments': [
+            {
+                'exam_description': exam_description(i),
+                'index': j,
+                'name': f'Task {j + 1}',
+                'text': 'x' * assignment_text_size,
+            } for i in range(num_of_exams) for j in range(assignments_per_exam)
+        ],
+    }
+
+    for name, items in resources.items():
+        with open(os.path.join(resources_dir, f'{name}.json'), 'w') as fp:
+            json.dump(items, fp)
+
+
+def write_env(workdir, db_uri, violations_limit):
+    with open(os.path.join(workdir, '.env'), 'w') as fp:
+        fp.write(f'db.uri={db_uri}\n')
+        fp.write(f'violations.limit={violations_limit}\n')
+
+
+def process_env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+    return env
+
+
+def reset_and_seed(workdir):
+    # the workdir holds the generated .env and resources/, both of which are resolved relative to the cwd
+    subprocess.run([sys.executable, '-c', RESET_SCHEMA], cwd=workdir, env=process_env(), check=True)
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, 'seed.py')], cwd=workdir, env=process_env(), check=True)
+
+
+def wait_until_up(url, timeout_in_seconds=30):
+    deadline = perf_counter() + timeout_in_seconds
+    while perf_counter() < deadline:
+        try:
+            get(url, timeout=1)
+            return
+        except RequestException:
+            sleep(0.2)
+    raise RuntimeError(f'{url} did not come up within {timeout_in_seconds}s')
@@ -0,0 +1,139 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from datetime import datetime
+from time import perf_counter
+
+from requests import get, post
+
+from benchmark import fixtures
+from benchmark.scenarios import SCENARIOS, BenchmarkClient, Recorder, ScenarioSettings, VirtualStudent
+
+# the server port is fixed in server.py, the fake Minerva listens on the default minerva.url
+SERVER_URL = 'http://localhost:5000'
+MINERVA_PORT = 9091
+
+
+def parse_args():
+    parser = ArgumentParser(description='Boots server.py against a freshly seeded database and a fake Minerva, '
+                                        'drives the exam workflow and reports per-endpoint latency as JSON.')
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--exams', type=int, default=2)
+    parser.add_argument('--assignments-per-exam', type=int, default=3)
+    parser.add_argument('--assignment-text-size', type=int, default=4096)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--violations-per-student', type=int, default=2)
+    parser.add_argument('--violations-limit', type=int, default=3)
+    parser.add_argument('--max-polls', type=int, default=5)
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--events-timeout', type=float, default=10.0,
+                        help='seconds to wait for all submissions to be graded over the event stream')
+    parser.add_argument('--submission-size', type=int, default=2048, help='submission content size in bytes')
+    parser.add_argument('--minerva-latency', type=float, default=0.01)
+    parser.add_argument('--minerva-grading-time', type=float, default=1.0)
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--db-uri', help='database to run against, it is dropped and re-seeded; '
+                                         'defaults to a SQLite file in the workdir')
+    parser.add_argument('--workdir', help='directory for the generated .env, resources and logs')
+    parser.add_argument('--output', help='file to write the JSON report to, defaults to stdout')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='hogwarts-bench-'))
+    os.makedirs(workdir, exist_ok=True)
+    db_uri = args.db_uri or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+
+    fixtures.write_env(workdir, db_uri, args.violations_limit)
+    fixtures.write_resources(workdir, args.students, args.exams, args.assignments_per_exam,
+                             args.assignment_text_size)
+    fixtures.reset_and_seed(workdir)
+
+    processes = [
+        _spawn([sys.executable, '-m', 'benchmark.fake_minerva', '--port', str(MINERVA_PORT),
+                '--latency', str(args.minerva_latency), '--grading-time', str(args.minerva_grading_time)],
+               fixtures.REPO_DIR, os.path.join(workdir, 'minerva.out')),
+        _spawn([sys.executable, os.path.join(fixtures.REPO_DIR, 'server.py')],
+               workdir, os.path.join(workdir, 'server.out')),
+    ]
+    try:
+        fixtures.wait_until_up(f'http://localhost:{MINERVA_PORT}/api/v1/submissions/_all')
+        fixtures.wait_until_up(f'{SERVER_URL}/api/v1/courses')
+
+        students = _create_students(args)
+        settings = ScenarioSettings(args.concurrency, args.violations_per_student, args.max_polls,
+                                    args.poll_interval, args.submission_size, args.events_timeout)
+        report = {
+            'commit': _current_commit(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'parameters': {**vars(args), 'db_uri': db_uri.split(':', 1)[0]},
+            'scenarios': {},
+        }
+        for name in SCENARIOS:
+            if name in args.scenarios:
+                report['scenarios'][name] = _run_scenario(name, students, settings)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(output)
+    else:
+        print(output)
+
+
+def _run_scenario(name, students, settings):
+    recorder = Recorder()
+    start = perf_counter()
+    SCENARIOS[name](BenchmarkClient(SERVER_URL, recorder), students, settings)
+    duration = perf_counter() - start
+    return {'duration_s': round(duration, 3), 'endpoints': recorder.summary(duration)}
+
+
+def _create_students(args):
+    # the exams are looked up through the API, the assignment ids are deterministic since the database is re-seeded
+    token = post(f'{SERVER_URL}/api/v1/auth', json={
+        'identifier': fixtures.STAFF_EMAIL,
+        'password': fixtures.STAFF_PASSWORD,
+    }).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    exam_ids = {}
+    for course in get(f'{SERVER_URL}/api/v1/courses', headers=headers).json()['data']['courses']:
+        exams = get(f'{SERVER_URL}/api/v1/courses/{course["id"]}/exams', headers=headers).json()['data']['exams']
+        exam_ids.update({exam['description']: exam['id'] for exam in exams})
+
+    students = []
+    for i in range(args.students):
+        exam_index = i % args.exams
+        first_assignment_id = exam_index * args.assignments_per_exam + 1
+        students.append(VirtualStudent(
+            fixtures.student_identifier(i),
+            exam_ids[fixtures.exam_description(exam_index)],
+            list(range(first_assignment_id, first_assignment_id + args.assignments_per_exam)),
+        ))
+    return students
+
+
+def _spawn(command, cwd, log_path):
+    log_file = open(log_path, 'w')
+    return subprocess.Popen(command, cwd=cwd, env=fixtures.process_env(), stdout=log_file,
+                            stderr=subprocess.STDOUT)
+
+
+def _current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=fixtures.REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import Lock
+from time import perf_counter, sleep
+from typing import List
+
+from requests import Session
+from requests.exceptions import RequestException
+
+from benchmark.fixtures import STUDENT_PASSWORD
+
+
+@dataclass
+class VirtualStudent:
+    identifier: str
+    exam_id: int
+    assignment_ids: List[int]
+    session: Session = field(default_factory=Session)
+    token: str = None
+    submission_ids: List[int] = field(default_factory=list)
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = Lock()
+        self._samples = defaultdict(list)
+
+    def record(self, endpoint, latency, status_code):
+        with self._lock:
+            self._samples[endpoint].append((latency, status_code))
+
+    def summary(self, duration):
+        with self._lock:
+            samples = dict(self._samples)
+
+        return {endpoint: _summarize(endpoint_samples, duration) for endpoint, endpoint_samples in samples.items()}
+
+
+class BenchmarkClient:
+    def __init__(self, base_url, recorder):
+        self._base_url = base_url
+        self._recorder = recorder
+
+    def call(self, session, method, endpoint, path, token=None, payload=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+
+        start = perf_counter()
+        try:
+            response = session.request(method, f'{self._base_url}{path}', json=payload, headers=headers)
+            status_code = response.status_code
+        except RequestException:
+            response, status_code = None, 0
+        self._recorder.record(endpoint, perf_counter() - start, status_code)
+
+        if response is None or status_code >= 400:
+            return None
+        return response.json()
+
+    def listen_until(self, session, endpoint, path, token, submission_ids, timeout_in_seconds):
+        # records the time until every given submission is reported as graded over the event stream
+        headers = {'Authorization': f'Bearer {token}'}
+        pending = set(submission_ids)
+
+        start = perf_counter()
+        status_code = 0
+        try:
+            with session.get(f'{self._base_url}{path}', headers=headers, stream=True,
+                             timeout=timeout_in_seconds) as response:
+                status_code = response.status_code
+                for line in response.iter_lines(decode_unicode=True):
+                    if line and line.startswith('data: '):
+                        submission = json.loads(line[len('data: '):])
+                        if submission.get('status') == 'GRADED':
+                            pending.discard(submission['id'])
+                    if not pending or perf_counter() - start > timeout_in_seconds:
+                        break
+        except RequestException:
+            pass
+
+        if pending and status_code < 400:
+            # timing out before everything got graded counts as a failure
+            status_code = 0
+        self._recorder.record(endpoint, perf_counter() - start, status_code)
+
+
+@dataclass
+class ScenarioSettings:
+    concurrency: int
+    violations_per_student: int
+    max_polls: int
+    poll_interval: float
+    submission_size: int
+    events_timeout: float
+
+
+def login_storm(client, students, settings):
+    def login(student):
+        response = client.call(student.session, 'POST', 'POST /api/v1/auth', '/api/v1/auth', payload={
+            'identifier': student.identifier,
+            'password': STUDENT_PASSWORD,
+        })
+        student.token = response['access_token'] if response else None
+
+    _fan_out(login, students, settings)
+
+
+def start_exam_burst(client, students, settings):
+    def start(student):
+        client.call(student.session, 'POST', 'POST /api/v1/exams/<exam_id>/start',
+                    f'/api/v1/exams/{student.exam_id}/start', student.token)
+
+    _fan_out(start, students, settings)
+
+
+def violation_flood(client, students, settings):
+    def report(student):
+        for i in range(settings.violations_per_student):
+            client.call(student.session, 'POST', 'POST /api/v1/exams/<exam_id>/violation',
+                        f'/api/v1/exams/{student.exam_id}/violation', student.token, {
+                            'assignment_id': str(student.assignment_ids[i % len(student.assignment_ids)]),
+                            'violation_type': 'TAB_VIOLATION' if i % 2 else 'COPY_PASTE_VIOLATION',
+                        })
+
+    _fan_out(report, students, settings)
+
+
+def submit_spike(client, students, settings):
+    content = 'print("hello")\n' * max(1, settings.submission_size // 15)
+
+    def submit(student):
+        for assignment_id in student.assignment_ids:
+            # the submit route is declared as GET with a JSON body
+            response = client.call(student.session, 'GET',
+                                   'GET /api/v1/exams/<exam_id>/assignments/<assignment_id>/submit',
+                                   f'/api/v1/exams/{student.exam_id}/assignments/{assignment_id}/submit',
+                                   student.token, {'environment': 'python3.10', 'content': content})
+            if response:
+                student.submission_ids.append(response['data']['id'])
+
+    _fan_out(submit, students, settings)
+
+
+def submission_polling(client, students, settings):
+    def poll(student):
+        pending = list(student.submission_ids)
+        for _ in range(settings.max_polls):
+            client.call(student.session, 'GET', 'GET /api/v1/exams/<exam_id>/submissions',
+                        f'/api/v1/exams/{student.exam_id}/submissions', student.token)
+
+            still_pending = []
+            for submission_id in pending:
+                response = client.call(student.session, 'GET',
+                                       'GET /api/v1/exams/<exam_id>/submissions/<submission_id>',
+                                       f'/api/v1/exams/{student.exam_id}/submissions/{submission_id}',
+                                       student.token)
+                if not response or response['data'].get('status') != 'GRADED':
+                    still_pending.append(submission_id)
+
+            pending = still_pending
+            if not pending:
+                return
+            sleep(settings.poll_interval)
+
+    _fan_out(poll, students, settings)
+
+
+def submission_events(client, students, settings):
+    def listen(student):
+        client.listen_until(student.session, 'GET /api/v1/exams/<exam_id>/submissions/events',
+                            f'/api/v1/exams/{student.exam_id}/submissions/events', student.token,
+                            set(student.submission_ids), settings.events_timeout)
+
+    _fan_out(listen, students, settings)
+
+
+def exam_completion(client, students, settings):
+    def complete(student):
+        client.call(student.session, 'POST', 'POST /api/v1/exams/<exam_id>/complete',
+                    f'/api/v1/exams/{student.exam_id}/complete', student.token)
+
+    _fan_out(complete, students, settings)
+
+
+# the order matters, every scenario relies on the state left behind by the previous ones
+SCENARIOS = {
+    'login_storm': login_storm,
+    'start_exam_burst': start_exam_burst,
+    'violation_flood': violation_flood,
+    'submit_spike': submit_spike,
+    'submission_events': submission_events,
+    'submission_polling': submission_polling,
+    'exam_completion': exam_completion,
+}
+
+
+def _fan_out(fn, students, settings):
+    with ThreadPoolExecutor(max_workers=settings.concurrency) as executor:
+        # consume the results so that exceptions raised in workers are not swallowed
+        list(executor.map(fn, students))
+
+
+def _summarize(samples, duration):
+    latencies = sorted(latency for latency, _ in samples)
+    rejected = sum(1 for _, status_code in samples if status_code == 429)
+    errors = sum(1 for _, status_code in samples if status_code == 0 or status_code >= 400) - rejected
+    return {
+        'count': len(samples),
+        'errors': errors,
+        'rejected': rejected,
+        'throughput_rps': round(len(samples) / duration, 2) if duration else None,
+        'mean_ms': round(1000 * sum(latencies) / len(latencies), 2),
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'max_ms': round(1000 * latencies[-1], 2),
+    }
+
+
+def _percentile(sorted_latencies, percentile):
+    # nearest-rank method
+    rank = max(1, -(-len(sorted_latencies) * percentile // 100))
+    return round(1000 * sorted_latencies[rank - 1], 2)
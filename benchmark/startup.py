@@ -0,0 +1,62 @@
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser
+from statistics import median
+
+from benchmark import fixtures
+
+# runs in a fresh interpreter, so nothing is imported yet
+MEASURE_STARTUP = '''
+import json
+from time import perf_counter
+
+started = perf_counter()
+import flask, flask_sqlalchemy
+libraries = perf_counter()
+import server
+imported = perf_counter()
+from app import create_app
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'LOG_FILE': None, 'EXAM_SCHEDULER_INTERVAL': 0})
+created = perf_counter()
+app.test_client().post('/api/v1/auth', json={})
+served = perf_counter()
+print(json.dumps({
+    'library_import_ms': 1000 * (libraries - started),
+    'import_ms': 1000 * (imported - started),
+    'create_app_ms': 1000 * (created - imported),
+    'first_request_ms': 1000 * (served - created),
+}))
+'''
+
+# generous enough for a loaded CI machine, the libraries alone take most of the import budget
+DEFAULT_BUDGETS_IN_MS = {'import_ms': 450, 'create_app_ms': 50, 'first_request_ms': 50}
+
+
+def measure(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', MEASURE_STARTUP], cwd=fixtures.REPO_DIR, env=fixtures.process_env(),
+                                check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output))
+    return {name: round(median(sample[name] for sample in samples), 1) for name in samples[0]}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Measures the import and startup time of a worker against a time budget, '
+                                        'exits with 1 when the budget is exceeded.')
+    parser.add_argument('--runs', type=int, default=5)
+    for name, budget in DEFAULT_BUDGETS_IN_MS.items():
+        parser.add_argument(f'--{name.replace("_ms", "").replace("_", "-")}-budget-ms', dest=name, type=float,
+                            default=budget)
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    over_budget = [name for name in DEFAULT_BUDGETS_IN_MS if results[name] > getattr(args, name)]
+    print(json.dumps({
+        'runs': args.runs,
+        'results': results,
+        'budgets': {name: getattr(args, name) for name in DEFAULT_BUDGETS_IN_MS},
+        'over_budget': over_budget,
+    }, indent=2))
+    sys.exit(1 if over_budget else 0)
@@ -0,0 +1,74 @@
+import json
+import subprocess
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+from requests import post
+
+from benchmark import fixtures
+from minerva_client import MinervaClient
+
+USER_HEADER = 'X-albus-user-id'
+
+
+def forward_streamed(minerva_url, body):
+    data = json.loads(body)
+    client = MinervaClient(minerva_url, USER_HEADER, 1)
+    return client.submit(1, 'Task 1', data['environment'], 1, data['content'], 1)
+
+
+def forward_form_encoded(minerva_url, body):
+    # what the submit route did before: the whole payload form encoded in memory
+    data = json.loads(body)
+    payload = {
+        'assignmentId': 1,
+        'assignmentName': 'Task 1',
+        'environment': data['environment'],
+        'examId': 1,
+        'content': data['content'],
+    }
+    return post(f'{minerva_url}/api/v1/submissions', payload, headers={USER_HEADER: '1'}).json()
+
+
+def measure_peak_per_submission(forward, minerva_url, bodies):
+    # the request bodies are allocated before tracing starts, they are the unavoidable receive buffers
+    tracemalloc.start()
+    with ThreadPoolExecutor(max_workers=len(bodies)) as executor:
+        list(executor.map(lambda body: forward(minerva_url, body), bodies))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak // len(bodies)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Measures the peak memory per in-flight submission forwarded to Minerva.')
+    parser.add_argument('--size', type=int, default=1024 * 1024, help='submission content size in bytes')
+    parser.add_argument('--in-flight', type=int, default=8)
+    parser.add_argument('--port', type=int, default=9191)
+    args = parser.parse_args()
+
+    minerva_url = f'http://localhost:{args.port}'
+    minerva = subprocess.Popen([sys.executable, '-m', 'benchmark.fake_minerva', '--port', str(args.port),
+                                '--latency', '0'], cwd=fixtures.REPO_DIR, env=fixtures.process_env(),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        fixtures.wait_until_up(f'{minerva_url}/api/v1/submissions/_all')
+        content = ('print("hello")\n' * (args.size // 15 + 1))[:args.size]
+        bodies = [json.dumps({'environment': 'python3.10', 'content': content}).encode('utf-8')
+                  for _ in range(args.in_flight)]
+
+        streamed = measure_peak_per_submission(forward_streamed, minerva_url, bodies)
+        form_encoded = measure_peak_per_submission(forward_form_encoded, minerva_url, bodies)
+    finally:
+        minerva.terminate()
+        minerva.wait()
+
+    print(json.dumps({
+        'content_bytes': args.size,
+        'in_flight': args.in_flight,
+        'streamed_peak_bytes_per_submission': streamed,
+        'form_encoded_peak_bytes_per_submission': form_encoded,
+        'reduction': round(form_encoded / streamed, 2) if streamed else None,
+    }, indent=2))
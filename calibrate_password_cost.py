@@ -0,0 +1,30 @@
+import json
+from argparse import ArgumentParser
+
+from dotenv import set_key
+
+from util.password_util import calibrate_rounds, measure_verify_seconds, MIN_ROUNDS, MAX_ROUNDS
+
+ROUNDS_KEY = 'password.bcrypt.rounds'
+
+# Picks the bcrypt cost for a target login verification time on this machine and stores it in the .env, existing
+# hashes are upgraded on the next login of each user.
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Calibrates the bcrypt cost factor for a target password verification time.')
+    parser.add_argument('--target-ms', type=float, default=250)
+    parser.add_argument('--min-rounds', type=int, default=MIN_ROUNDS)
+    parser.add_argument('--max-rounds', type=int, default=MAX_ROUNDS)
+    parser.add_argument('--env', default='.env', help='the .env file the cost is written to')
+    parser.add_argument('--dry-run', action='store_true', help='only print the calibrated cost')
+    args = parser.parse_args()
+
+    rounds = calibrate_rounds(args.target_ms / 1000, args.min_rounds, args.max_rounds)
+    if not args.dry_run:
+        set_key(args.env, ROUNDS_KEY, str(rounds), quote_mode='never')
+
+    print(json.dumps({
+        'rounds': rounds,
+        'verify_ms': round(1000 * measure_verify_seconds(rounds), 1),
+        'target_ms': args.target_ms,
+        'written_to': None if args.dry_run else args.env,
+    }, indent=2))
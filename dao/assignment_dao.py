@@ -5,3 +5,6 @@ from model import Assignment
 class AssignmentDAO(GenericDAO):
     def __init__(self, session):
         super().__init__(session, Assignment)
+
+    def find_by_exam_id(self, exam_id):
+        return Assignment.query.filter_by(exam_id=exam_id).order_by(Assignment.index).all()
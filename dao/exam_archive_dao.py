@@ -0,0 +1,164 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import select, delete, func, text, table, column, DateTime
+from sqlalchemy.orm import class_mapper
+
+from dao.generic_dao import GenericDAO
+from model import ExamArchive, EXAM_PARTITIONED_MODELS
+
+ARCHIVE_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 1000
+
+
+def to_partition_name(table_name, exam_id):
+    return f'{table_name}_exam_{int(exam_id)}'
+
+
+# Moves the rows of the exam scoped event tables from the hot, partitioned tables to the cold archive files.
+# Archived rows are only read back when a caller explicitly asks for them (see find_archived).
+class ExamArchiveDAO(GenericDAO):
+    def __init__(self, session, archive_dir):
+        super().__init__(session, ExamArchive)
+        self._archive_dir = archive_dir
+
+    # Called ahead of the exam start, creating a partition briefly locks the whole table
+    def create_exam_partitions(self, exam_ids):
+        if not exam_ids or not self._is_postgres():
+            return []
+
+        created = []
+        try:
+            for model in EXAM_PARTITIONED_MODELS:
+                table_name = model.__tablename__
+                if not self._is_partitioned(table_name):
+                    continue
+                partitions = self._find_partitions(table_name)
+                for exam_id in exam_ids:
+                    partition = to_partition_name(table_name, exam_id)
+                    # rows already routed to the default partition would violate the bounds of the new partition
+                    if partition in partitions or self._session.execute(
+                            text(f'SELECT 1 FROM {table_name}_default WHERE exam_id = :exam_id LIMIT 1'),
+                            {'exam_id': exam_id}).first():
+                        continue
+                    self._session.execute(text(f'CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table_name} '
+                                               f'FOR VALUES IN ({int(exam_id)})'))
+                    created.append(partition)
+            self._session.commit()
+            return created
+        except Exception as e:
+            self._session.rollback()
+            raise e
+
+    def find_archived_table_names(self, exam_id):
+        return {table_name for table_name, in self._session.query(ExamArchive.table_name).filter_by(exam_id=exam_id)}
+
+    # Writes the exam's rows to a compressed file, then detaches and drops the exam partition (or deletes the rows
+    # when the table is not partitioned). Returns None when rows changed while archiving, the next run retries.
+    def archive(self, model, exam_id):
+        table_name = model.__tablename__
+        partition = self._find_exam_partition(table_name, exam_id)
+        source = table(partition, *[column(c.name) for c in model.__table__.columns]) if partition else model.__table__
+        condition = source.c.exam_id == exam_id
+        path = self._to_archive_path(table_name, exam_id)
+
+        rows = self._session.execute(select(source).where(condition),
+                                     execution_options={'stream_results': True}).yield_per(ARCHIVE_CHUNK_SIZE)
+        row_count = write_archive(path, rows)
+
+        try:
+            if self._session.execute(select(func.count()).select_from(source).where(condition)).scalar() != row_count:
+                self._session.rollback()
+                return None
+
+            if partition:
+                self._session.execute(text(f'ALTER TABLE {table_name} DETACH PARTITION {partition}'))
+                self._session.execute(text(f'DROP TABLE {partition}'))
+            else:
+                self._session.execute(delete(model.__table__).where(model.__table__.c.exam_id == exam_id))
+            self._session.add(ExamArchive(exam_id, table_name, path, row_count))
+            self._session.commit()
+            return row_count
+        except Exception as e:
+            self._session.rollback()
+            raise e
+
+    def _to_archive_path(self, table_name, exam_id):
+        return os.path.abspath(os.path.join(self._archive_dir, table_name, f'exam_{int(exam_id)}.ndjson.gz'))
+
+    def _is_postgres(self):
+        return self._session.bind.dialect.name == 'postgresql'
+
+    def _is_partitioned(self, table_name):
+        return self._session.execute(text('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name)'),
+                                     {'name': table_name}).first() is not None
+
+    def _find_partitions(self, table_name):
+        return {name for name, in self._session.execute(text(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(:name)'), {'name': table_name})}
+
+    def _find_exam_partition(self, table_name, exam_id):
+        if not self._is_postgres():
+            return None
+        partition = to_partition_name(table_name, exam_id)
+        return partition if partition in self._find_partitions(table_name) else None
+
+
+# The archived rows of an exam as detached entities, empty when the exam is not archived
+def find_archived(model, exam_id):
+    archive = ExamArchive.query.get((exam_id, model.__tablename__))
+    if archive is None:
+        return []
+    return [to_entity(model, row) for row in read_archive(archive.path)]
+
+
+# The given columns of every row of the exam as tuples, the hot rows through a server side cursor followed by the
+# archived ones, without ever holding more than a chunk in memory
+def stream_by_exam(session, model, exam_id, column_names, order_by):
+    columns = [getattr(model, name) for name in column_names]
+    yield from session.execute(select(*columns).where(model.exam_id == exam_id).order_by(*order_by),
+                               execution_options={'stream_results': True}).yield_per(EXPORT_CHUNK_SIZE)
+
+    archive = ExamArchive.query.get((exam_id, model.__tablename__))
+    if archive is not None:
+        for row in read_archive(archive.path):
+            yield tuple(to_column_value(model.__table__.c[name], row.get(name)) for name in column_names)
+
+
+# one JSON object per line, written to a temporary file first so that a crash never leaves a truncated archive
+def write_archive(path, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    row_count = 0
+    with open(temporary_path, 'wb') as fp:
+        with gzip.GzipFile(fileobj=fp, mode='wb') as archive:
+            for row in rows:
+                archive.write(json.dumps(dict(row._mapping), default=datetime.isoformat).encode('utf-8') + b'\n')
+                row_count += 1
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(temporary_path, path)
+    return row_count
+
+
+def read_archive(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            yield json.loads(line)
+
+
+def to_entity(model, row):
+    # built without __init__ and never added to the session, archived rows are read only
+    entity = class_mapper(model).class_manager.new_instance()
+    for c in model.__table__.columns:
+        setattr(entity, c.name, to_column_value(c, row.get(c.name)))
+    return entity
+
+
+def to_column_value(c, value):
+    if value is not None and isinstance(c.type, DateTime):
+        return datetime.fromisoformat(value)
+    return value
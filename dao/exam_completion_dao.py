@@ -1,5 +1,8 @@
+from datetime import datetime
+
 from sqlalchemy import and_
 
+from dao.exam_archive_dao import find_archived, stream_by_exam
 from dao.generic_dao import GenericDAO
 from model import ExamCompletion
 
@@ -15,3 +18,33 @@ class ExamCompletionDAO(GenericDAO):
         return ExamCompletion.query.filter(
             and_(ExamCompletion.exam_id.in_(exam_ids), ExamCompletion.student_id == student_id,
                  ExamCompletion.completed == True)).all()
+
+    # archived completions are read from the cold storage, only when asked for
+    def find_by_exam(self, exam_id, include_archived=False):
+        completions = ExamCompletion.query.filter_by(exam_id=exam_id).all()
+        if include_archived:
+            completions += find_archived(ExamCompletion, exam_id)
+        return completions
+
+    # archived completions included, see stream_by_exam
+    def stream_by_exam(self, exam_id, column_names):
+        return stream_by_exam(self._session, ExamCompletion, exam_id, column_names, [ExamCompletion.student_id])
+
+    def find_student_ids_by_exam(self, exam_id, include_archived=False):
+        student_ids = [student_id for student_id, in self._session.query(ExamCompletion.student_id).filter_by(
+            exam_id=exam_id).all()]
+        if include_archived:
+            student_ids += [completion.student_id for completion in find_archived(ExamCompletion, exam_id)]
+        return student_ids
+
+    def complete_all_by_exams(self, exam_ids, completion_reason):
+        try:
+            updated = ExamCompletion.query.filter(
+                and_(ExamCompletion.exam_id.in_(exam_ids), ExamCompletion.completed == False)).update(
+                {'completed': True, 'completion_reason': completion_reason, 'updated_at': datetime.utcnow()},
+                synchronize_session=False)
+            self._session.commit()
+            return updated
+        except Exception as e:
+            self._session.rollback()
+            raise e
@@ -1,3 +1,8 @@
+from datetime import datetime
+
+from sqlalchemy import and_
+from sqlalchemy.orm import joinedload
+
 from dao.generic_dao import GenericDAO
 from model import Exam
 
@@ -8,3 +13,41 @@ class ExamDAO(GenericDAO):
 
     def find_by_course_id(self, course_id):
         return Exam.query.filter_by(course_id=course_id).all()
+
+    # exam and its assignments (ordered by index) in a single query
+    def find_with_assignments(self, exam_id):
+        return Exam.query.options(joinedload(Exam.assignments)).filter_by(id=exam_id).first()
+
+    def find_by_description(self, description):
+        return Exam.query.filter_by(description=description).first()
+
+    def find_ids_by_status(self, status):
+        return [exam_id for exam_id, in self._session.query(Exam.id).filter(Exam.status == status).all()]
+
+    def find_starting_until(self, until):
+        return [exam_id for exam_id, in self._session.query(Exam.id).filter(
+            and_(Exam.status == 'INACTIVE', Exam.start_at <= until)).all()]
+
+    def find_completed_before(self, until):
+        return [exam_id for exam_id, in self._session.query(Exam.id).filter(
+            and_(Exam.status == 'COMPLETED', Exam.updated_at <= until)).all()]
+
+    def activate_scheduled(self, now):
+        return self._transition(and_(Exam.status == 'INACTIVE', Exam.start_at <= now), 'ACTIVE')
+
+    def complete_ended(self, now):
+        return self._transition(and_(Exam.status == 'ACTIVE', Exam.end_at <= now), 'COMPLETED')
+
+    def _transition(self, condition, status):
+        # the condition is repeated in the UPDATE of every exam, so of concurrent schedulers only the one whose UPDATE
+        # changed the row gets the exam back and applies the transition (closing it, creating partitions...)
+        try:
+            candidate_ids = [exam_id for exam_id, in self._session.query(Exam.id).filter(condition).all()]
+            exam_ids = [exam_id for exam_id in candidate_ids
+                        if Exam.query.filter(and_(Exam.id == exam_id, condition)).update(
+                            {'status': status, 'updated_at': datetime.utcnow()}, synchronize_session=False)]
+            self._session.commit()
+            return exam_ids
+        except Exception as e:
+            self._session.rollback()
+            raise e
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from dao.generic_dao import GenericDAO
+from model import ExamResult
+
+
+class ExamResultDAO(GenericDAO):
+    def __init__(self, session):
+        super().__init__(session, ExamResult)
+
+    def find_by_exam(self, exam_id):
+        return ExamResult.query.filter_by(exam_id=exam_id).order_by(ExamResult.student_id,
+                                                                    ExamResult.assignment_id).all()
+
+    # best_scores: (student id, assignment id) -> (score, submission id), only improvements are written
+    def save_best_scores(self, exam_id, best_scores):
+        try:
+            student_ids = {student_id for student_id, _ in best_scores}
+            existing = {(result.student_id, result.assignment_id): result for result in ExamResult.query.filter(
+                ExamResult.exam_id == exam_id, ExamResult.student_id.in_(student_ids)).all()}
+
+            updated = 0
+            for (student_id, assignment_id), (score, submission_id) in best_scores.items():
+                result = existing.get((student_id, assignment_id))
+                if result is None:
+                    self._session.add(ExamResult(exam_id, student_id, assignment_id, score, submission_id))
+                elif score > result.best_score:
+                    result.best_score = score
+                    result.submission_id = submission_id
+                    result.updated_at = datetime.utcnow()
+                else:
+                    continue
+                updated += 1
+
+            self._session.commit()
+            return updated
+        except Exception as e:
+            self._session.rollback()
+            raise e
@@ -1,10 +1,89 @@
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from dao.exam_archive_dao import find_archived, stream_by_exam
 from dao.generic_dao import GenericDAO
-from model import ExamViolation
+from model import ExamViolation, ExamViolationSummary
 
 
 class ExamViolationDAO(GenericDAO):
     def __init__(self, session):
         super().__init__(session, ExamViolation)
 
+    # archived violations are read from the cold storage, only when asked for
+    def find_by_exam(self, exam_id, include_archived=False):
+        violations = ExamViolation.query.filter_by(exam_id=exam_id).order_by(ExamViolation.id).all()
+        if include_archived:
+            violations += find_archived(ExamViolation, exam_id)
+        return violations
+
+    # archived violations included, see stream_by_exam
+    def stream_by_exam(self, exam_id, column_names):
+        return stream_by_exam(self._session, ExamViolation, exam_id, column_names, [ExamViolation.id])
+
+    def exists_by_journal_key(self, exam_id, journal_key):
+        return self._session.query(
+            ExamViolation.query.filter_by(exam_id=exam_id, journal_key=journal_key).exists()).scalar()
+
+    # one more event repeating the violation, False when the violation is gone (e.g. archived)
+    def add_occurrence(self, exam_id, violation_id, occurred_at):
+        try:
+            updated = ExamViolation.query.filter_by(exam_id=exam_id, id=violation_id).update(
+                {ExamViolation.occurrences: ExamViolation.occurrences + 1, ExamViolation.updated_at: occurred_at},
+                synchronize_session=False)
+            self._session.commit()
+            return updated > 0
+        except Exception as e:
+            self._session.rollback()
+            raise e
+
+    # (id, created at) of the latest violation of the student with the same assignment and type since the given time
+    def find_recent(self, exam_id, student_id, assignment_id, violation_type, since):
+        return self._session.query(ExamViolation.id, ExamViolation.created_at).filter(
+            ExamViolation.exam_id == exam_id, ExamViolation.student_id == student_id,
+            ExamViolation.assignment_id == assignment_id, ExamViolation.violation_type == violation_type,
+            ExamViolation.created_at >= since).order_by(ExamViolation.id.desc()).first()
+
     def count_exam_violations(self, student_id, exam_id):
         return ExamViolation.query.filter_by(student_id=student_id, exam_id=exam_id).count()
+
+    # stores the violation and bumps its summary counter in the same transaction, returns the student's total
+    def insert_with_summary(self, exam_violation):
+        try:
+            self._session.add(exam_violation)
+            self._increment_summary(exam_violation)
+            self._session.commit()
+        except Exception as e:
+            self._session.rollback()
+            raise e
+        return self.count_summarized_violations(exam_violation.student_id, exam_violation.exam_id)
+
+    def count_summarized_violations(self, student_id, exam_id):
+        return self._session.query(func.coalesce(func.sum(ExamViolationSummary.count), 0)).filter_by(
+            exam_id=exam_id, student_id=student_id).scalar()
+
+    def find_summary_by_exam(self, exam_id):
+        return ExamViolationSummary.query.filter_by(exam_id=exam_id).all()
+
+    def _increment_summary(self, exam_violation):
+        key = {
+            'exam_id': exam_violation.exam_id,
+            'student_id': exam_violation.student_id,
+            'assignment_id': exam_violation.assignment_id or '',
+            'violation_type': exam_violation.violation_type,
+        }
+        increment = {
+            ExamViolationSummary.count: ExamViolationSummary.count + 1,
+            ExamViolationSummary.updated_at: datetime.utcnow(),
+        }
+
+        # the counter row is created on the first violation, a concurrent creation falls back to the update
+        if ExamViolationSummary.query.filter_by(**key).update(increment, synchronize_session=False):
+            return
+        try:
+            with self._session.begin_nested():
+                self._session.add(ExamViolationSummary(**key, count=1))
+        except IntegrityError:
+            ExamViolationSummary.query.filter_by(**key).update(increment, synchronize_session=False)
@@ -1,8 +1,8 @@
-from dao.generic_dao import GenericDAO
+from dao.user_dao import UserDAO
 from model import Student
 
 
-class StudentDAO(GenericDAO):
+class StudentDAO(UserDAO):
     def __init__(self, session):
         super().__init__(session, Student)
 
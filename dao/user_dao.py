@@ -0,0 +1,14 @@
+from dao.generic_dao import GenericDAO
+
+
+class UserDAO(GenericDAO):
+    # compare and set, a password changed in the meantime is kept
+    def replace_password(self, user_id, old_password, new_password):
+        try:
+            updated = self._entity.query.filter_by(id=user_id, password=old_password).update(
+                {'password': new_password}, synchronize_session=False)
+            self._session.commit()
+            return updated
+        except Exception as e:
+            self._session.rollback()
+            raise e
@@ -0,0 +1,49 @@
+import json
+from datetime import datetime, timedelta
+
+from model import EXAM_PARTITIONED_MODELS
+from util.logging import logger
+
+
+# Moves the violations and completions of long completed exams out of the database. Detaching a partition locks the
+# whole table for a moment, so this runs as a separate job (e.g. nightly from cron) rather than in the workers.
+class ExamArchiver:
+    def __init__(self, exam_dao, exam_archive_dao, archive_after_days):
+        self._exam_dao = exam_dao
+        self._exam_archive_dao = exam_archive_dao
+        self._archive_after = timedelta(days=archive_after_days)
+
+    # exam id -> {table name -> archived rows}
+    def run_once(self, now=None):
+        now = now or datetime.utcnow()
+        archived = {}
+        for exam_id in self._exam_dao.find_completed_before(now - self._archive_after):
+            archived_tables = self._exam_archive_dao.find_archived_table_names(exam_id)
+            for model in EXAM_PARTITIONED_MODELS:
+                if model.__tablename__ in archived_tables:
+                    continue
+                try:
+                    row_count = self._exam_archive_dao.archive(model, exam_id)
+                except Exception as e:
+                    logger.error(f'Archiving {model.__tablename__} of exam {exam_id} failed: {e}')
+                    continue
+
+                if row_count is None:
+                    logger.warning(f'{model.__tablename__} of exam {exam_id} changed while archiving, will retry')
+                    continue
+                archived.setdefault(exam_id, {})[model.__tablename__] = row_count
+
+        if archived:
+            logger.info(f'Exam archiver: archived = {archived}')
+        return archived
+
+
+if __name__ == '__main__':
+    from app import create_app
+    from server import get_services
+
+    app = create_app()
+    with app.app_context():
+        services = get_services()
+        archiver = ExamArchiver(services.exam_dao, services.exam_archive_dao, app.config['ARCHIVE_AFTER_DAYS'])
+        print(json.dumps(archiver.run_once()))
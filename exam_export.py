@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+COMPLETION_EXPORT_COLUMNS = ['exam_id', 'student_id', 'completed', 'completion_reason', 'created_at', 'updated_at']
+VIOLATION_EXPORT_COLUMNS = ['id', 'exam_id', 'student_id', 'assignment_id', 'violation_type', 'occurrences',
+                            'created_at', 'updated_at']
+# rows buffered before a chunk is handed to the response
+EXPORT_ROWS_PER_CHUNK = 500
+
+
+# Report rows (tuples in the order of the columns) encoded chunk by chunk, the whole export is never in memory
+def to_csv_chunks(column_names, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(column_names)
+    for index, row in enumerate(rows, 1):
+        writer.writerow([to_csv_value(value) for value in row])
+        if index % EXPORT_ROWS_PER_CHUNK == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def to_ndjson_chunks(column_names, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(column_names, row)), default=datetime.isoformat))
+        if len(lines) == EXPORT_ROWS_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+# format -> (mimetype, encoder)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', to_csv_chunks),
+    'ndjson': ('application/x-ndjson', to_ndjson_chunks),
+}
+
+
+def to_csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _drain(buffer):
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return chunk
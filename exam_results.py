@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import has_app_context
+
+from exception import HogwartsException
+from model import Role
+from util.logging import logger
+
+
+# Builds the materialized exam scoreboard. A full aggregation fans out to Minerva for every student of the exam with
+# bounded concurrency, afterwards the scoreboard is kept up to date incrementally from the graded submissions.
+class ExamResultsAggregator:
+    def __init__(self, app, minerva_client, exam_completion_dao, exam_result_dao, max_concurrency):
+        self._app = app
+        self._minerva_client = minerva_client
+        self._exam_completion_dao = exam_completion_dao
+        self._exam_result_dao = exam_result_dao
+        self._max_concurrency = max_concurrency
+
+    def aggregate(self, exam_id):
+        # a rebuild is explicitly requested by staff, so it also covers exams already moved to the archive
+        student_ids = self._exam_completion_dao.find_student_ids_by_exam(exam_id, include_archived=True)
+
+        def fetch(student_id):
+            try:
+                return student_id, self._minerva_client.get_exam_results(exam_id, student_id)
+            except HogwartsException as e:
+                logger.warning(f'Failed to fetch results of student {student_id} for exam {exam_id}: {e.message}')
+                return student_id, None
+
+        best_scores = {}
+        failed_student_ids = []
+        # only the Minerva calls run in the pool, the DB session stays in the calling thread
+        with ThreadPoolExecutor(max_workers=self._max_concurrency) as executor:
+            for student_id, submissions in executor.map(fetch, student_ids):
+                if submissions is None:
+                    failed_student_ids.append(student_id)
+                    continue
+                for submission in submissions:
+                    _reduce(best_scores, student_id, submission)
+
+        updated = self._exam_result_dao.save_best_scores(exam_id, best_scores) if best_scores else 0
+        return {'students': len(student_ids), 'failed_students': failed_student_ids, 'updated_results': updated}
+
+    # SubmissionNotifier listener
+    def record(self, exam_id, user, submission):
+        if user.role != Role.STUDENT:
+            return
+
+        best_scores = {}
+        _reduce(best_scores, user.id, submission)
+        if not best_scores:
+            return
+
+        # the poller thread has no app context, the callback route already runs in one
+        if has_app_context():
+            self._exam_result_dao.save_best_scores(exam_id, best_scores)
+        else:
+            with self._app.app_context():
+                self._exam_result_dao.save_best_scores(exam_id, best_scores)
+
+
+def to_scoreboard(exam_id, results):
+    students = {}
+    for result in results:
+        student = students.setdefault(result.student_id, {
+            'student_id': result.student_id,
+            'total_score': 0,
+            'assignments': [],
+        })
+        student['total_score'] += result.best_score
+        student['assignments'].append(result.to_dict())
+
+    return {
+        'exam_id': exam_id,
+        'students': sorted(students.values(), key=lambda student: student['total_score'], reverse=True),
+    }
+
+
+def _reduce(best_scores, student_id, submission):
+    score = submission.get('score')
+    assignment_id = submission.get('assignmentId')
+    if score is None or assignment_id is None:
+        return
+
+    key = (student_id, int(assignment_id))
+    best = best_scores.get(key)
+    if best is None or score > best[0]:
+        best_scores[key] = (float(score), int(submission['id']))
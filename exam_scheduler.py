@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from threading import Thread, Event, Lock
+
+from util.logging import logger
+
+EXAM_ENDED_REASON = 'Exam ended'
+
+
+# Moves exams through their lifecycle based on their start_at/end_at. Every transition is a set-based UPDATE, so
+# closing an exam finalizes all of its open completions at once instead of leaving them to be checked on access.
+class ExamScheduler:
+    def __init__(self, app, exam_dao, exam_completion_dao, exam_archive_dao, exam_caches, assignment_cache,
+                 load_assignments, interval_in_seconds, warm_up_window_in_minutes):
+        self._app = app
+        self._exam_dao = exam_dao
+        self._exam_completion_dao = exam_completion_dao
+        self._exam_archive_dao = exam_archive_dao
+        # caches keyed by exam id that depend on the exam status
+        self._exam_caches = exam_caches
+        self._assignment_cache = assignment_cache
+        # exam id -> the value cached in the assignment cache
+        self._load_assignments = load_assignments
+        self._interval_in_seconds = interval_in_seconds
+        self._warm_up_window = timedelta(minutes=warm_up_window_in_minutes)
+        self._thread = None
+        self._lock = Lock()
+        self._stopped = Event()
+
+    def start(self):
+        with self._lock:
+            if self._interval_in_seconds <= 0 or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = Thread(target=self._run, name='exam-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run_once(self, now=None):
+        now = now or datetime.utcnow()
+        started_exam_ids = self._exam_dao.activate_scheduled(now)
+        ended_exam_ids = self._exam_dao.complete_ended(now)
+        self.invalidate(started_exam_ids)
+        self.close_exams(ended_exam_ids)
+        self.warm_up(self._exam_dao.find_starting_until(now + self._warm_up_window) + started_exam_ids)
+
+        if started_exam_ids or ended_exam_ids:
+            logger.info(f'Exam scheduler: started = {started_exam_ids}, ended = {ended_exam_ids}')
+
+    def close_exams(self, exam_ids):
+        if not exam_ids:
+            return
+        self._exam_completion_dao.complete_all_by_exams(exam_ids, EXAM_ENDED_REASON)
+        self.invalidate(exam_ids)
+        for exam_id in exam_ids:
+            self._assignment_cache.invalidate(exam_id)
+
+    def invalidate(self, exam_ids):
+        for exam_id in exam_ids:
+            for cache in self._exam_caches:
+                cache.invalidate(exam_id)
+
+    def warm_up(self, exam_ids):
+        # the exam partitions are created before the first student starts the exam
+        self._exam_archive_dao.create_exam_partitions(exam_ids)
+        for exam_id in exam_ids:
+            if self._assignment_cache.get(exam_id) is None:
+                self._assignment_cache.put(exam_id, self._load_assignments(exam_id))
+
+    def _run(self):
+        while not self._stopped.wait(self._interval_in_seconds):
+            try:
+                with self._app.app_context():
+                    self.run_once()
+            except Exception as e:
+                logger.error(f'Exam scheduler run failed: {e}')
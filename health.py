@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from threading import Lock
+from time import monotonic, perf_counter
+
+from util.logging import logger
+
+UP = 'UP'
+DOWN = 'DOWN'
+
+
+# Readiness of a worker: its warm up is done and every dependency answers a probe in time. The dependencies are
+# probed at most once per TTL, so frequent load balancer checks do not add load on the database or Minerva.
+class HealthMonitor:
+    def __init__(self, app, probes, warm_up, probe_timeout_in_seconds, cache_ttl_in_seconds):
+        self._app = app
+        # dependency name -> fn(), raises when the dependency is unavailable
+        self._probes = probes
+        self._warm_up = warm_up
+        self._probe_timeout_in_seconds = probe_timeout_in_seconds
+        self._cache_ttl_in_seconds = cache_ttl_in_seconds
+        self._executor = ThreadPoolExecutor(max_workers=len(probes) + 1, thread_name_prefix='health')
+        self._lock = Lock()
+        self._probe_lock = Lock()
+        self._warm_up_future = None
+        self._warmed_up = False
+        # dependency name -> future of a probe still running, a hanging dependency does not pile up probes
+        self._running_probes = {}
+        self._dependencies = None
+        self._checked_at = None
+        self._probed_at = 0
+
+    def start_warm_up(self):
+        with self._lock:
+            if self._warm_up_future is None:
+                self._warm_up_future = self._executor.submit(self._run_warm_up)
+
+    def readiness(self):
+        self.start_warm_up()
+        dependencies = self._check_dependencies()
+        ready = self._warmed_up and all(dependency['status'] == UP for dependency in dependencies.values())
+        return {
+            'status': 'READY' if ready else 'NOT_READY',
+            'warmed_up': self._warmed_up,
+            'dependencies': dependencies,
+            'checked_at': self._checked_at,
+        }
+
+    def _check_dependencies(self):
+        with self._probe_lock:
+            if self._dependencies is not None and monotonic() - self._probed_at < self._cache_ttl_in_seconds:
+                return self._dependencies
+
+            futures = {}
+            for name, probe in self._probes.items():
+                running = self._running_probes.get(name)
+                if running is None or running.done():
+                    self._running_probes[name] = self._executor.submit(self._run_probe, name, probe)
+                futures[name] = self._running_probes[name]
+            wait(futures.values(), timeout=self._probe_timeout_in_seconds)
+
+            self._dependencies = {name: future.result() if future.done() else to_dependency(DOWN, error='Timed out')
+                                  for name, future in futures.items()}
+            self._probed_at = monotonic()
+            self._checked_at = datetime.utcnow().isoformat()
+            return self._dependencies
+
+    def _run_probe(self, name, probe):
+        started = perf_counter()
+        try:
+            with self._app.app_context():
+                probe()
+            return to_dependency(UP, perf_counter() - started)
+        except Exception as e:
+            # the readiness endpoint is public and the messages name hosts, ports and users, only the type is returned
+            logger.warning(f'Health probe {name} failed: {e}')
+            return to_dependency(DOWN, perf_counter() - started, type(e).__name__)
+
+    def _run_warm_up(self):
+        try:
+            with self._app.app_context():
+                self._warm_up()
+            self._warmed_up = True
+        except Exception as e:
+            logger.error(f'Worker warm up failed: {e}')
+            # retried by the next readiness check
+            with self._lock:
+                self._warm_up_future = None
+
+
+def to_dependency(status, latency_in_seconds=None, error=None):
+    dependency = {
+        'status': status,
+        'latency_ms': round(1000 * latency_in_seconds, 2) if latency_in_seconds is not None else None,
+    }
+    if error:
+        dependency['error'] = error
+    return dependency
@@ -0,0 +1,357 @@
+import fcntl
+import json
+import os
+import zlib
+from collections import OrderedDict
+from threading import Lock, Condition, Thread, Event
+from time import time, sleep, monotonic
+from uuid import uuid4
+
+from sqlalchemy.exc import OperationalError, InterfaceError, DisconnectionError, TimeoutError as PoolTimeoutError
+
+from util.logging import logger
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+CHECKPOINT_FILE = 'checkpoint'
+JOURNAL_ID_FILE = 'journal_id'
+LOCK_FILE = 'lock'
+REJECTED_FILE = 'rejected.log'
+MAX_SLOTS = 1024
+REPLAY_BATCH_SIZE = 500
+# results of applied records kept for the requests waiting on them
+MAX_PENDING_RESULTS = 1024
+# result of a record set aside because its handler failed, the write never happened
+REJECTED_RESULT = ('Write rejected', 500)
+
+# the database is stalled or unreachable, the record is retried later
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError)
+
+fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+
+# Every process appends to its own slot of the journal directory, the slot stays locked while the process lives.
+# A new process takes over the first free slot, including the records a crashed process did not replay.
+def claim_slot(directory):
+    for slot in range(MAX_SLOTS):
+        path = os.path.join(directory, str(slot))
+        os.makedirs(path, exist_ok=True)
+        fd = os.open(os.path.join(path, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return path, fd
+        except BlockingIOError:
+            os.close(fd)
+    raise RuntimeError(f'No free journal slot in {directory}')
+
+
+def to_line(record):
+    payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+
+# None for a torn or corrupted line
+def parse_line(line):
+    if not line.endswith(b'\n') or len(line) < 10:
+        return None
+    checksum, payload = line[:8], line[9:-1]
+    try:
+        if int(checksum, 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+# Append-only local journal of writes, split in segment files named after their first sequence number. A record is
+# acknowledged once it is on disk, concurrent appends share a single fdatasync (group commit).
+class Journal:
+    def __init__(self, directory, segment_size, fsync_delay_in_seconds):
+        self._directory, self._lock_fd = claim_slot(directory)
+        self._journal_id = self._load_journal_id()
+        self._segment_size = segment_size
+        self._fsync_delay_in_seconds = fsync_delay_in_seconds
+        self._write_lock = Lock()
+        self._synced = Condition()
+        self._syncing = False
+        self._segments = sorted(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                                for name in os.listdir(self._directory)
+                                if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+
+        # sequence numbers continue after the replayed records, they are part of the idempotency keys
+        last_seq = max(self._recover(), self.load_checkpoint()[0])
+        self._written_seq = self._synced_seq = last_seq
+        self._fd = None
+        self._open_segment(last_seq + 1)
+
+    @property
+    def last_seq(self):
+        return self._written_seq
+
+    def append(self, record_type, data):
+        with self._write_lock:
+            seq = self._written_seq + 1
+            if self._segment_bytes >= self._segment_size:
+                self._rotate(seq)
+            line = to_line({'seq': seq, 'key': f'{self._journal_id}:{seq}', 'at': time(), 'type': record_type,
+                            'data': data})
+            written = 0
+            while written < len(line):
+                written += os.write(self._fd, line[written:])
+            self._segment_bytes += len(line)
+            self._written_seq = seq
+        self._wait_until_synced(seq)
+        return seq
+
+    # durable records after the position, each with the position right after it
+    def read(self, position, max_records):
+        segment, offset = position
+        synced_seq = self._synced_seq
+        records = []
+        while len(records) < max_records:
+            reached_end = True
+            try:
+                with open(self._segment_path(segment), 'rb') as fp:
+                    fp.seek(offset)
+                    for line in fp:
+                        record = parse_line(line)
+                        if record is None or record['seq'] > synced_seq:
+                            reached_end = False
+                            break
+                        offset += len(line)
+                        records.append((record, (segment, offset)))
+                        if len(records) == max_records:
+                            return records
+            except FileNotFoundError:
+                pass
+
+            later_segments = [first_seq for first_seq in self._segments if first_seq > segment]
+            if not reached_end or not later_segments:
+                break
+            segment, offset = later_segments[0], 0
+        return records
+
+    def initial_position(self):
+        return self._segments[0], 0
+
+    # (applied seq, position)
+    def load_checkpoint(self):
+        try:
+            with open(os.path.join(self._directory, CHECKPOINT_FILE)) as fp:
+                checkpoint = json.load(fp)
+            return checkpoint['seq'], tuple(checkpoint['position'])
+        except FileNotFoundError:
+            return 0, None
+
+    # not synced, losing it only replays records again and replaying is idempotent
+    def save_checkpoint(self, seq, position):
+        path = os.path.join(self._directory, CHECKPOINT_FILE)
+        with open(f'{path}.tmp', 'w') as fp:
+            json.dump({'seq': seq, 'position': position}, fp)
+        os.replace(f'{path}.tmp', path)
+
+    # deletes the segments entirely before the position
+    def release(self, position):
+        with self._write_lock:
+            released = [first_seq for first_seq in self._segments if first_seq < position[0]]
+            self._segments = [first_seq for first_seq in self._segments if first_seq >= position[0]]
+        for first_seq in released:
+            os.remove(self._segment_path(first_seq))
+
+    def reject(self, record, error):
+        with open(os.path.join(self._directory, REJECTED_FILE), 'a') as fp:
+            fp.write(json.dumps({**record, 'error': str(error)}) + '\n')
+
+    def _wait_until_synced(self, seq):
+        with self._synced:
+            while self._synced_seq < seq:
+                if self._syncing:
+                    self._synced.wait()
+                    continue
+
+                # the first waiter syncs for everybody who appended in the meantime
+                self._syncing = True
+                self._synced.release()
+                synced_seq = None
+                try:
+                    if self._fsync_delay_in_seconds:
+                        sleep(self._fsync_delay_in_seconds)
+                    with self._write_lock:
+                        fdatasync(self._fd)
+                        synced_seq = self._written_seq
+                finally:
+                    self._synced.acquire()
+                    self._syncing = False
+                    if synced_seq is not None:
+                        self._synced_seq = max(self._synced_seq, synced_seq)
+                    self._synced.notify_all()
+
+    def _rotate(self, first_seq):
+        fdatasync(self._fd)
+        os.close(self._fd)
+        self._open_segment(first_seq)
+
+    def _open_segment(self, first_seq):
+        self._fd = os.open(self._segment_path(first_seq), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segment_bytes = os.fstat(self._fd).st_size
+        if first_seq not in self._segments:
+            self._segments.append(first_seq)
+            # the new directory entry has to be durable as well
+            directory_fd = os.open(self._directory, os.O_RDONLY)
+            try:
+                os.fsync(directory_fd)
+            finally:
+                os.close(directory_fd)
+
+    # last durable seq, a torn tail left by a crash is cut off
+    def _recover(self):
+        if not self._segments:
+            return 0
+
+        path = self._segment_path(self._segments[-1])
+        last_seq = self._segments[-1] - 1
+        valid_bytes = 0
+        with open(path, 'rb') as fp:
+            for line in fp:
+                record = parse_line(line)
+                if record is None:
+                    break
+                last_seq = record['seq']
+                valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(path):
+            logger.warning(f'Truncating the torn tail of {path} after seq {last_seq}')
+            os.truncate(path, valid_bytes)
+        return last_seq
+
+    def _load_journal_id(self):
+        path = os.path.join(self._directory, JOURNAL_ID_FILE)
+        if not os.path.exists(path):
+            with open(path, 'w') as fp:
+                fp.write(uuid4().hex)
+        with open(path) as fp:
+            return fp.read().strip()
+
+    def _segment_path(self, first_seq):
+        return os.path.join(self._directory, f'{SEGMENT_PREFIX}{first_seq:020d}{SEGMENT_SUFFIX}')
+
+
+# Applies the journaled writes to the database in order, on a single background thread. The request that journaled a
+# write waits a bounded time for it to be applied and is acknowledged either way, so a stalled database never holds a
+# request thread longer than the inline wait. The trade-off: every write is handed over to the replayer thread, and
+# one whose database call outlives the inline wait is only acknowledged as durable (202), its result is not known yet.
+class JournalReplayer:
+    def __init__(self, app, journal, session, handlers, retry_interval_in_seconds, inline_wait_in_seconds):
+        self._app = app
+        self._journal = journal
+        self._session = session
+        # record type -> fn(key, data), must be idempotent, may return a result for the request that wrote the record
+        self._handlers = handlers
+        self._retry_interval_in_seconds = retry_interval_in_seconds
+        self._inline_wait_in_seconds = inline_wait_in_seconds
+        self._applied_seq, position = journal.load_checkpoint()
+        self._position = position or journal.initial_position()
+        self._healthy = True
+        # monotonic time the record being applied was picked up at, None while idle
+        self._applying_since = None
+        # guards _applied_seq and _results, notified whenever a record is applied
+        self._applied = Condition()
+        # seq -> result of the handler, only the results that are not None
+        self._results = OrderedDict()
+        self._wake_up = Event()
+        self._thread = None
+        self._thread_lock = Lock()
+        self._stopped = Event()
+
+    def start(self):
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = Thread(target=self._run, name='journal-replayer', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake_up.set()
+
+    # (True, result of the handler) when the write is already in the database, (False, None) when it is only durable
+    # in the journal
+    def submit(self, record_type, data):
+        seq = self._journal.append(record_type, data)
+        self.start()
+        self._wake_up.set()
+
+        # no point in waiting while the database is failing or the replayer is stuck on an earlier record
+        applying_since = self._applying_since
+        stuck = applying_since is not None and monotonic() - applying_since > self._inline_wait_in_seconds
+        with self._applied:
+            if self._healthy and not stuck:
+                self._applied.wait_for(lambda: self._applied_seq >= seq, self._inline_wait_in_seconds)
+            if self._applied_seq < seq:
+                return False, None
+            return True, self._results.pop(seq, None)
+
+    def lag(self):
+        pending = self._journal.read(self._position, 1)
+        return {
+            'records': max(self._journal.last_seq - self._applied_seq, 0),
+            'seconds': round(time() - pending[0][0]['at'], 3) if pending else 0.0,
+            'healthy': self._healthy,
+        }
+
+    def _replay(self):
+        while True:
+            records = self._journal.read(self._position, REPLAY_BATCH_SIZE)
+            if not records:
+                return
+
+            for record, position in records:
+                # records up to the checkpoint may be read again after a restart
+                result = None
+                if record['seq'] > self._applied_seq:
+                    self._applying_since = monotonic()
+                    try:
+                        result = self._handlers[record['type']](record['key'], record['data'])
+                    except TRANSIENT_ERRORS as e:
+                        self._session.rollback()
+                        if self._healthy:
+                            logger.warning(f'Journal replay paused at seq {record["seq"]}: {e}')
+                        self._healthy = False
+                        self._journal.save_checkpoint(self._applied_seq, self._position)
+                        return
+                    except Exception as e:
+                        self._session.rollback()
+                        # retrying cannot fix it, the record is set aside so that the following ones are not blocked
+                        logger.error(f'Journal record {record["key"]} rejected: {e}')
+                        self._journal.reject(record, e)
+                        result = REJECTED_RESULT
+                    finally:
+                        self._applying_since = None
+                self._position = position
+                with self._applied:
+                    self._applied_seq = record['seq']
+                    if result is not None:
+                        self._results[record['seq']] = result
+                        # nobody waits for the results of the records replayed after a stall
+                        while len(self._results) > MAX_PENDING_RESULTS:
+                            self._results.popitem(last=False)
+                    self._applied.notify_all()
+
+            self._healthy = True
+            self._journal.save_checkpoint(self._applied_seq, self._position)
+            self._journal.release(self._position)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            # new records wake the replayer up right away, while the database is failing it only retries on the interval
+            if self._healthy:
+                self._wake_up.wait(self._retry_interval_in_seconds)
+            else:
+                self._stopped.wait(self._retry_interval_in_seconds)
+            self._wake_up.clear()
+            if self._stopped.is_set() or self._journal.last_seq <= self._applied_seq:
+                continue
+            try:
+                with self._app.app_context():
+                    self._replay()
+            except Exception as e:
+                logger.error(f'Journal replay failed: {e}')
@@ -1,3 +1,5 @@
+import json
+import zlib
 from time import sleep
 
 from requests import post, get
@@ -7,6 +9,8 @@ from util.logging import logger
 
 CLIENT_ERROR_STATUS_CODES = [400, 401, 403, 409]
 RETRYABLE_STATUS_CODES = [502, 503, 429]
+# large string fields (the submitted code) are escaped and compressed in chunks of this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 class MinervaClient:
@@ -16,7 +20,7 @@ class MinervaClient:
         self._max_retry = max_retry
 
     def submit(self, assignment_id, assignment_name, environment, exam_id, content, user_id):
-        headers = {self._user_header: user_id}
+        headers = self._headers(user_id)
         payload = {
             'assignmentId': assignment_id,
             'assignmentName': assignment_name,
@@ -29,34 +33,53 @@ class MinervaClient:
         return self._post(url, headers, payload, 202)
 
     def list_my_submissions(self, exam_id, page, size, user_id):
-        headers = {self._user_header: user_id}
+        headers = self._headers(user_id)
         url = f'{self._url}/api/v1/submissions?examId={exam_id}&page={page}&size={size}'
         return self._get(url, headers, 200)
 
     def list_all_submissions(self, page, size, user_id):
-        headers = {self._user_header: user_id}
+        headers = self._headers(user_id)
         url = f'{self._url}/api/v1/submissions/_all?page={page}&size={size}'
         return self._get(url, headers, 200)
 
     def get_submission(self, submission_id, user_id):
-        headers = {self._user_header: user_id}
+        headers = self._headers(user_id)
         url = f'{self._url}/api/v1/submissions/{submission_id}'
         return self._get(url, headers, 200)
 
     def get_allowance(self, assignment_id, user_id):
-        headers = {self._user_header: user_id}
+        headers = self._headers(user_id)
         url = f'{self._url}/api/v1/submissions/allowance?assignmentId={assignment_id}'
         return self._get(url, headers, 200)
 
-    def get_exam_results(self):
-        # TODO
-        pass
+    # all submissions of the user for the exam, page by page
+    def get_exam_results(self, exam_id, user_id, page_size=50):
+        submissions = []
+        page = 0
+        while True:
+            page_submissions = to_submissions(self.list_my_submissions(exam_id, page, page_size, user_id))
+            submissions.extend(page_submissions)
+            if len(page_submissions) < page_size:
+                return submissions
+            page += 1
+
+    # Connectivity check for the readiness probe: a single attempt, any answer below 500 means Minerva is reachable
+    def ping(self, timeout_in_seconds):
+        response = get(self._url, timeout=timeout_in_seconds)
+        if response.status_code >= 500:
+            raise HogwartsException(f'Minerva responded with {response.status_code}', 503)
+
+    def _headers(self, user_id):
+        return {self._user_header: str(user_id)}
 
     def _post(self, url, headers, payload, expected_status_code=200):
-        return self._execute_with_retry(lambda _: post(url, payload, headers=headers), expected_status_code)
+        # the body is streamed as gzipped JSON, a new stream is created for every attempt
+        headers = {**headers, 'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+        return self._execute_with_retry(lambda: post(url, data=to_gzipped_json_stream(payload), headers=headers),
+                                        expected_status_code)
 
     def _get(self, url, headers, expected_status_code=200):
-        return self._execute_with_retry(lambda _: get(url, headers=headers), expected_status_code)
+        return self._execute_with_retry(lambda: get(url, headers=headers), expected_status_code)
 
     def _execute_with_retry(self, exec, expected_status_code):
         attempt_count = 0
@@ -81,3 +104,35 @@ class MinervaClient:
                 sleep(2 ** attempt_count)
 
         raise HogwartsException('Grading service is currently unavailable', 503)
+
+
+def to_submissions(response):
+    if isinstance(response, list):
+        return response
+    return response.get('submissions') or response.get('content') or []
+
+
+def to_gzipped_json_stream(payload, chunk_size=STREAM_CHUNK_SIZE):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)  # gzip container
+    for chunk in _to_json_chunks(payload, chunk_size):
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _to_json_chunks(payload, chunk_size):
+    # same output as json.dumps(payload), without ever holding a serialized copy of a large value
+    yield '{'
+    for i, (key, value) in enumerate(payload.items()):
+        if i:
+            yield ', '
+        yield f'{json.dumps(key)}: '
+        if isinstance(value, str) and len(value) > chunk_size:
+            yield '"'
+            for start in range(0, len(value), chunk_size):
+                yield json.dumps(value[start:start + chunk_size])[1:-1]
+            yield '"'
+        else:
+            yield json.dumps(value)
+    yield '}'
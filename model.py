@@ -2,8 +2,10 @@ import enum
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import UniqueConstraint, DDL, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import relationship, backref
+from sqlalchemy.schema import PrimaryKeyConstraint
 
 from app import db
 
@@ -107,6 +109,9 @@ class Exam(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.Text, nullable=False)
     status = db.Column(db.String(20), nullable=False)  # INACTIVE, ACTIVE, COMPLETED
+    # optional schedule, applied by the exam scheduler
+    start_at = db.Column(db.DateTime, index=True)
+    end_at = db.Column(db.DateTime, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -118,21 +123,31 @@ class Exam(db.Model):
         primaryjoin="Exam.course_id == Course.id",
     )
 
-    def __init__(self, description, status, course_id):
+    def __init__(self, description, status, course_id, start_at=None, end_at=None):
         self.description = description
         self.status = status
         self.course_id = course_id
+        self.start_at = start_at
+        self.end_at = end_at
 
     def to_dict(self):
         return {
             'id': self.id,
             'description': self.description,
-            'status': self.status
+            'status': self.status,
+            'start_at': self.start_at.isoformat() if self.start_at else None,
+            'end_at': self.end_at.isoformat() if self.end_at else None,
         }
 
 
+# The exam scoped event tables are LIST partitioned by exam on Postgres, see dao.exam_archive_dao for the partitions.
+# Other databases ignore the option and keep a single table.
+EXAM_PARTITIONED_TABLE_ARGS = {'postgresql_partition_by': 'LIST (exam_id)', 'info': {'partition_key': 'exam_id'}}
+
+
 class ExamCompletion(db.Model):
     __tablename__ = 'exam_completion'
+    __table_args__ = EXAM_PARTITIONED_TABLE_ARGS
 
     exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
@@ -169,7 +184,7 @@ class Assignment(db.Model):
     exam_id = db.Column(db.Integer, db.ForeignKey("exam.id"), nullable=False)
     exam = relationship(
         Exam,
-        backref="assignments",
+        backref=backref("assignments", order_by="Assignment.index"),
         primaryjoin="Assignment.exam_id == Exam.id",
     )
 
@@ -178,15 +193,30 @@ class Assignment(db.Model):
         self.name = name
         self.text = text
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'exam_id': self.exam_id,
+            'index': self.index,
+            'name': self.name,
+            'text': self.text,
+        }
+
 
 class ExamViolation(db.Model):
     __tablename__ = 'exam_violation'
+    __table_args__ = (UniqueConstraint('exam_id', 'journal_key', name='_exam_violation_journal_key_uc'),
+                      EXAM_PARTITIONED_TABLE_ARGS)
 
     id = db.Column(db.Integer, primary_key=True)
-    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'))
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'))
     assignment_id = db.Column(db.String)
     violation_type = db.Column(db.String, nullable=False)
+    # set when written through the journal, makes replaying the record idempotent
+    journal_key = db.Column(db.String(64))
+    # events collapsed into this violation by the debounce window, updated_at is the last one
+    occurrences = db.Column(db.Integer, nullable=False, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -204,6 +234,93 @@ class ExamViolation(db.Model):
         }
 
 
+class ExamViolationSummary(db.Model):
+    __tablename__ = 'exam_violation_summary'
+    __table_args__ = (UniqueConstraint('exam_id', 'student_id', 'assignment_id', 'violation_type',
+                                       name='_exam_violation_summary_uc'),)
+
+    # per exam violation counters, maintained on every reported violation so that analytics never scan exam_violation
+    id = db.Column(db.Integer, primary_key=True)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False, index=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    # empty when the violation is not related to an assignment
+    assignment_id = db.Column(db.String, nullable=False, default='')
+    violation_type = db.Column(db.String, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, exam_id, student_id, assignment_id, violation_type, count=0):
+        self.exam_id = exam_id
+        self.student_id = student_id
+        self.assignment_id = assignment_id
+        self.violation_type = violation_type
+        self.count = count
+
+
+class ExamResult(db.Model):
+    __tablename__ = 'exam_result'
+
+    # materialized scoreboard, the best graded submission per student and assignment
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), primary_key=True)
+    best_score = db.Column(db.Float, nullable=False)
+    submission_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, exam_id, student_id, assignment_id, best_score, submission_id):
+        self.exam_id = exam_id
+        self.student_id = student_id
+        self.assignment_id = assignment_id
+        self.best_score = best_score
+        self.submission_id = submission_id
+
+    def to_dict(self):
+        return {
+            'assignment_id': self.assignment_id,
+            'best_score': self.best_score,
+            'submission_id': self.submission_id,
+        }
+
+
+class ExamArchive(db.Model):
+    __tablename__ = 'exam_archive'
+
+    # rows of an exam scoped event table moved out of the database into a compressed file by the exam archiver
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    table_name = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, exam_id, table_name, path, row_count):
+        self.exam_id = exam_id
+        self.table_name = table_name
+        self.path = path
+        self.row_count = row_count
+
+
+EXAM_PARTITIONED_MODELS = [ExamCompletion, ExamViolation]
+
+
+# Postgres requires the partition key in the primary key of a partitioned table, the ORM keeps identifying rows by id
+@compiles(PrimaryKeyConstraint, 'postgresql')
+def compile_primary_key(constraint, compiler, **kw):
+    sql = compiler.visit_primary_key_constraint(constraint, **kw)
+    partition_key = constraint.table.info.get('partition_key')
+    if partition_key and partition_key not in constraint.columns:
+        sql = f'{sql[:-1]}, {partition_key})'
+    return sql
+
+
+# rows of exams without their own partition yet
+for model in EXAM_PARTITIONED_MODELS:
+    event.listen(model.__table__, 'after_create', DDL(
+        f'CREATE TABLE IF NOT EXISTS {model.__tablename__}_default PARTITION OF {model.__tablename__} DEFAULT'
+    ).execute_if(dialect='postgresql'))
+
+
 class ViolationType(Enum):
     COPY_PASTE_VIOLATION = 'COPY_PASTE_VIOLATION'
     TAB_VIOLATION = 'TAB_VIOLATION'
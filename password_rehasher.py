@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from util.logging import logger
+from util.password_util import hash_password
+
+
+# Upgrades password hashes to the configured cost after a successful login. Hashing at the new cost is as slow as a
+# login, so it runs on a background thread and the login response does not wait for it.
+class PasswordRehasher:
+    def __init__(self, app, user_daos, rounds, max_pending):
+        self._app = app
+        # role -> DAO of the users with that role
+        self._user_daos = user_daos
+        self._rounds = rounds
+        self._max_pending = max_pending
+        # (role, user id) of the queued rehashes, the plain passwords are only kept until they are hashed
+        self._pending = set()
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-rehasher')
+
+    def submit(self, user, password):
+        key = (user.role, user.id)
+        with self._lock:
+            # the next login of the user tries again
+            if key in self._pending or len(self._pending) >= self._max_pending:
+                return False
+            self._pending.add(key)
+        self._executor.submit(self._rehash, key, password, user.password)
+        return True
+
+    def _rehash(self, key, password, old_hash):
+        role, user_id = key
+        try:
+            new_hash = hash_password(password, self._rounds)
+            with self._app.app_context():
+                self._user_daos[role].replace_password(user_id, old_hash, new_hash)
+        except Exception as e:
+            logger.error(f'Rehashing the password of {role.value} {user_id} failed: {e}')
+        finally:
+            with self._lock:
+                self._pending.discard(key)
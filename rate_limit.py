@@ -0,0 +1,94 @@
+import enum
+from collections import OrderedDict
+from dataclasses import dataclass
+from math import ceil
+from threading import Lock
+from time import monotonic
+
+MAX_TRACKED_BUCKETS = 10000
+
+
+class Priority(enum.IntEnum):
+    LOW = 0
+    NORMAL = 1
+    HIGH = 2
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    capacity: int
+    refill_per_second: float
+
+
+class TokenBucket:
+    def __init__(self, rate_limit, now):
+        self._rate_limit = rate_limit
+        self._tokens = float(rate_limit.capacity)
+        self._updated_at = now
+
+    def try_acquire(self, now):
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        # seconds until the next token becomes available
+        return (1 - self._tokens) / self._rate_limit.refill_per_second
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        self._tokens = min(self._rate_limit.capacity, self._tokens + elapsed * self._rate_limit.refill_per_second)
+        self._updated_at = now
+
+
+class RateLimiter:
+    def __init__(self, route_limits, default_limit):
+        self._route_limits = route_limits
+        self._default_limit = default_limit
+        # least recently used first, the oldest bucket is forgotten once too many are tracked. It is the one most
+        # likely to be full again, and a full bucket behaves exactly like a freshly created one.
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+    # returns 0 if the request is allowed, otherwise the number of seconds the client should wait
+    def try_acquire(self, route, client_key):
+        rate_limit = self._route_limits.get(route, self._default_limit)
+        if rate_limit is None:
+            return 0
+
+        now = monotonic()
+        with self._lock:
+            key = (route, client_key)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_TRACKED_BUCKETS:
+                    self._buckets.popitem(last=False)
+                bucket = self._buckets[key] = TokenBucket(rate_limit, now)
+            else:
+                self._buckets.move_to_end(key)
+            wait_time = bucket.try_acquire(now)
+
+        return ceil(wait_time) if wait_time else 0
+
+
+# Sheds load by priority once too many requests are in flight: low priority traffic (e.g. polling) is rejected
+# first, while submits and completions are still admitted until the worker is completely saturated.
+class AdmissionController:
+    def __init__(self, max_in_flight, admission_ratios):
+        self._limits = {priority: max(1, int(max_in_flight * ratio)) for priority, ratio in admission_ratios.items()}
+        self._in_flight = 0
+        self._lock = Lock()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def try_admit(self, priority):
+        with self._lock:
+            if self._in_flight >= self._limits[priority]:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
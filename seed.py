@@ -1,12 +1,14 @@
 import json
+import os
 
-from app import session
+from app import session, create_app
+from dao.assignment_dao import AssignmentDAO
 from dao.course_dao import CourseDAO
 from dao.environment_dao import EnvironmentDAO
 from dao.exam_dao import ExamDAO
 from dao.staff_dao import StaffDAO
 from dao.student_dao import StudentDAO
-from model import Environment, Student, Staff, Course, Exam
+from model import Environment, Student, Staff, Course, Exam, Assignment
 from util.password_util import hash_password
 
 
@@ -15,11 +17,16 @@ def load_json(filepath):
         return json.load(fp)
 
 
+# the DAOs need an application context, it stays pushed for the whole script
+app = create_app()
+app.app_context().push()
+
 environment_dao = EnvironmentDAO(session)
 student_dao = StudentDAO(session)
 staff_dao = StaffDAO(session)
 course_dao = CourseDAO(session)
 exam_dao = ExamDAO(session)
+assignment_dao = AssignmentDAO(session)
 
 # environments
 ENVIRONMENTS = load_json('resources/environments.json')
@@ -29,14 +36,14 @@ for environment in ENVIRONMENTS:
 # # students
 STUDENTS = load_json('resources/students.json')
 for student in STUDENTS:
-    student['password'] = hash_password(student['password'])
+    student['password'] = hash_password(student['password'], app.config['PASSWORD_ROUNDS'])
     student['active'] = True
     student_dao.insert(Student(**student))
 
 # staff
 STAFF = load_json('resources/staff.json')
 for staff in STAFF:
-    staff['password'] = hash_password(staff['password'])
+    staff['password'] = hash_password(staff['password'], app.config['PASSWORD_ROUNDS'])
     staff_dao.insert(Staff(**staff))
 
 # courses
@@ -57,3 +64,13 @@ for exam_data in EXAMS:
     exam = Exam(**exam_data)
 
     exam_dao.insert(exam)
+
+# assignments (optional)
+if os.path.exists('resources/assignments.json'):
+    ASSIGNMENTS = load_json('resources/assignments.json')
+    for assignment_data in ASSIGNMENTS:
+        exam = exam_dao.find_by_description(assignment_data.pop("exam_description"))
+        assignment = Assignment(**assignment_data)
+        assignment.exam_id = exam.id
+
+        assignment_dao.insert(assignment)
@@ -1,46 +1,385 @@
+import json
+from datetime import datetime, timezone
 from functools import wraps
-
-from flask import jsonify, request, g
-
-from app import db, app, session, violations_limit_per_exam
-from auth import AuthManager, UserContext
+from hmac import compare_digest
+from threading import RLock
+from time import time
+
+from flask import jsonify, request, g, Response, Blueprint, current_app, stream_with_context
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from werkzeug.exceptions import HTTPException
+from werkzeug.local import LocalProxy
+
+from app import db, session, create_app
+from auth import AuthManager, AuthPolicy, UserContext
 from dao.assignment_dao import AssignmentDAO
 from dao.course_dao import CourseDAO
 from dao.environment_dao import EnvironmentDAO
+from dao.exam_archive_dao import ExamArchiveDAO
 from dao.exam_completion_dao import ExamCompletionDAO
 from dao.exam_dao import ExamDAO
+from dao.exam_result_dao import ExamResultDAO
 from dao.exam_violation_dao import ExamViolationDAO
 from dao.staff_dao import StaffDAO
 from dao.student_dao import StudentDAO
+from exam_export import COMPLETION_EXPORT_COLUMNS, VIOLATION_EXPORT_COLUMNS, EXPORT_FORMATS
+from exam_results import ExamResultsAggregator, to_scoreboard
+from exam_scheduler import ExamScheduler
 from exception import HogwartsException, UNAUTHORIZED
-from minerva_client import MinervaClient
-from model import Exam, ExamCompletion, Role, ExamViolation
+from health import HealthMonitor
+from journal import Journal, JournalReplayer
+from model import Exam, ExamCompletion, Role, ExamViolation, ViolationType
+from password_rehasher import PasswordRehasher
+from rate_limit import RateLimiter, RateLimit, AdmissionController, Priority
+from submission_notifier import SubmissionNotifier
+from util.cache import Cache
+from util.http_caching import to_representation, to_conditional_response
 from util.logging import logger
-from util.password_util import password_matches
+from util.password_util import password_matches, needs_rehash
+from violation_analytics import to_violation_analytics
+from violation_debouncer import ViolationDebouncer
 
-auth_manager = AuthManager(180)
+api = Blueprint('api', __name__)
 
 BEARER = 'Bearer '
 
-WHITELISTED_URLS = ['/api/v1/auth']
+MINERVA_CALLBACK_SECRET_HEADER = 'X-minerva-callback-secret'
+SUBMISSION_EVENTS_KEEP_ALIVE_IN_SECONDS = 15
+
+# per route (endpoint name without the blueprint) token buckets, keyed by the user, by the submitted identifier and the
+# client address for login or by the client address when not authenticated
+DEFAULT_RATE_LIMIT = RateLimit(capacity=20, refill_per_second=10)
+ROUTE_RATE_LIMITS = {
+    # per account and address, so the whole class logging in at the exam start never shares a bucket and nobody can
+    # lock a student out by failing logins with their identifier from elsewhere
+    'login': RateLimit(capacity=10, refill_per_second=0.5),
+    'report_exam_violation': RateLimit(capacity=10, refill_per_second=2),
+    'submit': RateLimit(capacity=5, refill_per_second=0.2),
+    'list_submissions': RateLimit(capacity=5, refill_per_second=1),
+    'get_exam_results': RateLimit(capacity=5, refill_per_second=1),
+    'get_submission': RateLimit(capacity=10, refill_per_second=2),
+    'stream_submission_events': RateLimit(capacity=3, refill_per_second=0.1),
+    'aggregate_exam_results': RateLimit(capacity=2, refill_per_second=0.05),
+    'export_exam_completions': RateLimit(capacity=2, refill_per_second=0.05),
+    'export_exam_violations': RateLimit(capacity=2, refill_per_second=0.05),
+    'minerva_submission_callback': None,
+    'get_liveness': None,
+    'get_readiness': None,
+}
+
+# share of the in-flight requests each priority may occupy before it gets shed
+ADMISSION_RATIOS = {Priority.LOW: 0.5, Priority.NORMAL: 0.8, Priority.HIGH: 1.0}
+ROUTE_PRIORITIES = {
+    'submit': Priority.HIGH,
+    'start_exam_as_student': Priority.HIGH,
+    'complete_exam_as_student': Priority.HIGH,
+    'report_exam_violation': Priority.HIGH,
+    'minerva_submission_callback': Priority.HIGH,
+    'list_submissions': Priority.LOW,
+    'get_exam_results': Priority.LOW,
+    'get_submission': Priority.LOW,
+    'list_all_submissions': Priority.LOW,
+    'aggregate_exam_results': Priority.LOW,
+    'get_submission_allowance': Priority.LOW,
+    'get_exam_bundle': Priority.HIGH,
+    'get_journal_lag': Priority.LOW,
+    'export_exam_completions': Priority.LOW,
+    'export_exam_violations': Priority.LOW,
+    # an overloaded worker still answers its probes, shedding them would take it out of the load balancer
+    'get_liveness': Priority.HIGH,
+    'get_readiness': Priority.HIGH,
+}
+OVERLOAD_RETRY_AFTER_IN_SECONDS = 1
+
+VIOLATION_TYPES = {violation_type.value for violation_type in ViolationType}
+POLICY_VIOLATED_REASON = 'Course policy violated'
+
+# exams change state, a short TTL bounds the staleness across workers
+EXAM_CACHE_TTL_IN_SECONDS = 15
+EXAM_CACHE_MAX_EXAMS = 1024
+ASSIGNMENT_CACHE_TTL_IN_SECONDS = 300
+ASSIGNMENT_CACHE_MAX_EXAMS = 256
+EXAM_BUNDLE_CACHE_TTL_IN_SECONDS = 300
+EXAM_BUNDLE_CACHE_MAX_EXAMS = 256
+# graded submissions replayed to reconnecting event streams and served by get_submission without asking Minerva
+GRADED_SUBMISSION_CACHE_TTL_IN_SECONDS = 3600
+GRADED_SUBMISSION_CACHE_MAX_USERS = 10000
+
+SERVICES_EXTENSION = 'hogwarts.services'
+MINERVA_USER_HEADER = 'X-albus-user-id'
+MINERVA_MAX_RETRY = 3
+TOKEN_EXPIRATION_IN_MINUTES = 180
+# how long a request waits for the writes journaled before its own to be applied, then it is acknowledged anyway
+JOURNAL_INLINE_WAIT_IN_SECONDS = 1
+MAX_PENDING_PASSWORD_REHASHES = 1000
+VIOLATION_DEBOUNCE_MAX_KEYS = 10000
+# connections opened by the worker warm up, at most the pool size
+WARM_UP_CONNECTIONS = 5
+# the warmed up caches are plain data and survive a fork, everything else is rebuilt by the worker
+FORK_SAFE_SERVICES = {'exam_cache', 'assignment_cache', 'exam_bundle_cache'}
+
+
+def service(build):
+    name = build.__name__
+
+    @wraps(build)
+    def get(self):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = self._instances[name] = build(self)
+        return instance
+
+    return property(get)
+
+
+# The services of one application, each one built the first time a worker uses it
+class Services:
+    def __init__(self, app):
+        self._app = app
+        self._config = app.config
+        self._instances = {}
+        # reentrant, building a service builds the services it depends on
+        self._lock = RLock()
+
+    def reset_after_fork(self):
+        self._lock = RLock()
+        self._instances = {name: instance for name, instance in self._instances.items() if name in FORK_SAFE_SERVICES}
+
+    @service
+    def auth_manager(self):
+        return AuthManager(TOKEN_EXPIRATION_IN_MINUTES)
+
+    @service
+    def password_rehasher(self):
+        return PasswordRehasher(self._app, {Role.STUDENT: self.student_dao, Role.STAFF: self.staff_dao},
+                                self._config['PASSWORD_ROUNDS'], MAX_PENDING_PASSWORD_REHASHES)
+
+    @service
+    def environment_dao(self):
+        return EnvironmentDAO(session)
+
+    @service
+    def student_dao(self):
+        return StudentDAO(session)
+
+    @service
+    def staff_dao(self):
+        return StaffDAO(session)
+
+    @service
+    def course_dao(self):
+        return CourseDAO(session)
+
+    @service
+    def exam_dao(self):
+        return ExamDAO(session)
+
+    @service
+    def exam_completion_dao(self):
+        return ExamCompletionDAO(session)
+
+    @service
+    def exam_violation_dao(self):
+        return ExamViolationDAO(session)
+
+    @service
+    def assignment_dao(self):
+        return AssignmentDAO(session)
+
+    @service
+    def exam_result_dao(self):
+        return ExamResultDAO(session)
+
+    @service
+    def exam_archive_dao(self):
+        return ExamArchiveDAO(session, self._config['ARCHIVE_DIR'])
+
+    @service
+    def minerva_client(self):
+        # requests is only imported by the workers that talk to Minerva
+        from minerva_client import MinervaClient
+        return MinervaClient(self._config['MINERVA_URL'], MINERVA_USER_HEADER, MINERVA_MAX_RETRY)
+
+    @service
+    def submission_notifier(self):
+        notifier = SubmissionNotifier(self.minerva_client, self._config['SUBMISSION_POLL_INTERVAL'],
+                                      Cache(GRADED_SUBMISSION_CACHE_TTL_IN_SECONDS, GRADED_SUBMISSION_CACHE_MAX_USERS))
+        notifier.add_listener(self.exam_results_aggregator.record)
+        return notifier
+
+    @service
+    def exam_results_aggregator(self):
+        return ExamResultsAggregator(self._app, self.minerva_client, self.exam_completion_dao, self.exam_result_dao,
+                                     self._config['MINERVA_MAX_CONCURRENCY'])
+
+    @service
+    def rate_limiter(self):
+        return RateLimiter(ROUTE_RATE_LIMITS, DEFAULT_RATE_LIMIT)
+
+    @service
+    def admission_controller(self):
+        return AdmissionController(self._config['MAX_IN_FLIGHT_REQUESTS'], ADMISSION_RATIOS)
+
+    # exam id -> exam representation
+    @service
+    def exam_cache(self):
+        return Cache(EXAM_CACHE_TTL_IN_SECONDS, EXAM_CACHE_MAX_EXAMS)
+
+    # exam id -> {assignment id -> assignment representation}
+    @service
+    def assignment_cache(self):
+        return Cache(ASSIGNMENT_CACHE_TTL_IN_SECONDS, ASSIGNMENT_CACHE_MAX_EXAMS)
+
+    # exam id -> exam bundle representation, only active exams are cached
+    @service
+    def exam_bundle_cache(self):
+        return Cache(EXAM_BUNDLE_CACHE_TTL_IN_SECONDS, EXAM_BUNDLE_CACHE_MAX_EXAMS)
+
+    @service
+    def violation_debouncer(self):
+        return ViolationDebouncer(self._config['VIOLATIONS_DEBOUNCE_WINDOW'], VIOLATION_DEBOUNCE_MAX_KEYS,
+                                  find_recent_violation if self._config['VIOLATIONS_DEBOUNCE_SHARED'] else None)
+
+    @service
+    def journal_replayer(self):
+        journal = Journal(self._config['JOURNAL_DIR'], self._config['JOURNAL_SEGMENT_SIZE'],
+                          self._config['JOURNAL_FSYNC_DELAY'])
+        return JournalReplayer(self._app, journal, session, JOURNALED_WRITES, self._config['JOURNAL_REPLAY_INTERVAL'],
+                               JOURNAL_INLINE_WAIT_IN_SECONDS)
+
+    @service
+    def health_monitor(self):
+        return HealthMonitor(self._app, {'database': probe_database, 'minerva': probe_minerva}, warm_up_worker,
+                             self._config['HEALTH_PROBE_TIMEOUT'], self._config['HEALTH_CACHE_TTL'])
+
+    @service
+    def exam_scheduler(self):
+        return ExamScheduler(self._app, self.exam_dao, self.exam_completion_dao, self.exam_archive_dao,
+                             [self.exam_cache, self.exam_bundle_cache], self.assignment_cache, load_exam_assignments,
+                             self._config['EXAM_SCHEDULER_INTERVAL'], self._config['EXAM_WARM_UP_WINDOW'])
+
+
+def init_app(app):
+    app.extensions[SERVICES_EXTENSION] = Services(app)
+    app.register_blueprint(api)
+    compile_auth_policies(app)
+
+
+def get_services() -> Services:
+    return current_app.extensions[SERVICES_EXTENSION]
+
+
+def service_proxy(name):
+    return LocalProxy(lambda: getattr(get_services(), name))
+
+
+# resolved against the services of the current application
+auth_manager = service_proxy('auth_manager')
+password_rehasher = service_proxy('password_rehasher')
+environment_dao = service_proxy('environment_dao')
+student_dao = service_proxy('student_dao')
+staff_dao = service_proxy('staff_dao')
+course_dao = service_proxy('course_dao')
+exam_dao = service_proxy('exam_dao')
+exam_completion_dao = service_proxy('exam_completion_dao')
+exam_violation_dao = service_proxy('exam_violation_dao')
+assignment_dao = service_proxy('assignment_dao')
+exam_result_dao = service_proxy('exam_result_dao')
+minerva_client = service_proxy('minerva_client')
+submission_notifier = service_proxy('submission_notifier')
+exam_results_aggregator = service_proxy('exam_results_aggregator')
+rate_limiter = service_proxy('rate_limiter')
+admission_controller = service_proxy('admission_controller')
+exam_cache = service_proxy('exam_cache')
+assignment_cache = service_proxy('assignment_cache')
+exam_bundle_cache = service_proxy('exam_bundle_cache')
+exam_scheduler = service_proxy('exam_scheduler')
+journal_replayer = service_proxy('journal_replayer')
+violation_debouncer = service_proxy('violation_debouncer')
+health_monitor = service_proxy('health_monitor')
+
+
+def load_exam_assignments(exam_id):
+    return {assignment.id: to_representation(assignment.to_dict(), current_app.config['COMPRESSION_MIN_SIZE'])
+            for assignment in assignment_dao.find_by_exam_id(exam_id)}
+
+
+# Runs before the workers are forked (see app.warm_up), the active exams are cached once for all of them
+def warm_up():
+    exam_ids = exam_dao.find_ids_by_status('ACTIVE')
+    exam_scheduler.warm_up(exam_ids)
+    for exam_id in exam_ids:
+        get_exam_representation(exam_id)
+
+
+# Runs in every worker before it reports ready, the pool connections are opened ahead of the first requests
+def warm_up_worker():
+    pool = db.engine.pool
+    size = pool.size() if isinstance(pool, QueuePool) else 1
+    connections = []
+    try:
+        for _ in range(min(size, WARM_UP_CONNECTIONS)):
+            connections.append(db.engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+    warm_up()
+
+
+def probe_database():
+    session.execute(text('SELECT 1'))
+
+
+def probe_minerva():
+    minerva_client.ping(current_app.config['HEALTH_PROBE_TIMEOUT'])
 
-environment_dao = EnvironmentDAO(session)
-student_dao = StudentDAO(session)
-staff_dao = StaffDAO(session)
-course_dao = CourseDAO(session)
-exam_dao = ExamDAO(session)
-exam_completion_dao = ExamCompletionDAO(session)
-exam_violation_dao = ExamViolationDAO(session)
-assignment_dao = AssignmentDAO(session)
 
-minerva_client = MinervaClient('http://localhost:9091', 'X-albus-user-id', 3)
+#### Authn/z
+# The decorators only declare the policy of an endpoint, the policies are compiled into a lookup by endpoint name
+# once all the routes are registered and enforced in a single before_request hook.
+def public(fn):
+    fn.auth_policy = AuthPolicy.PUBLIC
+    return fn
+
+
+# Authorization decorator for any authenticated user
+def auth_required(fn):
+    fn.auth_policy = AuthPolicy.ANY
+    return fn
+
+
+# Authorization decorator for staff
+def staff_required(fn):
+    fn.auth_policy = AuthPolicy.STAFF
+    return fn
+
+
+# Authorization decorator for students
+def student_required(fn):
+    fn.auth_policy = AuthPolicy.STUDENT
+    return fn
+
+
+auth_policies = {}
+
+
+def compile_auth_policies(app):
+    # endpoints without a declared policy require an authenticated user
+    auth_policies.update({endpoint: getattr(view, 'auth_policy', AuthPolicy.ANY)
+                          for endpoint, view in app.view_functions.items()})
 
 
-#### Authn/z
 # Authentication endpoint
-@app.route('/api/v1/auth', methods=['POST'])
+@api.route('/api/v1/auth', methods=['POST'])
+@public
 def login():
     data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return bad_request('Bad credentials.')
     identifier = data.get('identifier')
     password = data.get('password')
 
@@ -54,69 +393,90 @@ def login():
     if not user or not password_matches(password, user.password):
         return unauthorized('Bad credentials')
 
+    # hashes with another cost than the configured one are upgraded in the background
+    if needs_rehash(user.password, current_app.config['PASSWORD_ROUNDS']):
+        password_rehasher.submit(user, password)
+
     access_token = auth_manager.create_token(user)
     g.token = access_token
     return {'access_token': access_token, 'role': user.role.value}, 200
 
 
-# Authorization decorator for any authenticated user
-def auth_required(fn):
-    @wraps(fn)
-    def wrapper(*args, **kwargs):
-        try:
-            identity = get_identity()
-        except Exception as e:
-            raise UNAUTHORIZED
-        return fn(*args, **kwargs)
+@api.before_app_request
+def authenticate():
+    g.identity = None
+    policy = auth_policies.get(request.endpoint)
+    # unknown urls are left to Flask's 404/405 handling
+    if policy is None or policy == AuthPolicy.PUBLIC:
+        return
 
-    return wrapper
+    authz_header = request.headers.get('Authorization')
+    if not authz_header or not authz_header.startswith(BEARER):
+        raise UNAUTHORIZED
 
+    # locals rather than g, every access to g goes through a context local lookup
+    token = authz_header[len(BEARER):]
+    identity = auth_manager.get_user(token)
+    g.token = token
+    g.identity = identity
 
-# Authorization decorator for staff
-def staff_required(fn):
-    @wraps(fn)
-    def wrapper(*args, **kwargs):
-        current_user = get_identity()
-        if current_user.role != Role.STAFF:
-            return forbidden('Staff access required')
-        return fn(*args, **kwargs)
+    if policy == AuthPolicy.STAFF and identity.role != Role.STAFF:
+        return forbidden('Staff access required')
+    if policy == AuthPolicy.STUDENT and identity.role != Role.STUDENT:
+        return forbidden('Student access required')
 
-    return wrapper
 
+@api.before_app_request
+def admit_request():
+    if request.endpoint is None:
+        return
 
-# Authorization decorator for students
-def student_required(fn):
-    @wraps(fn)
-    def wrapper(*args, **kwargs):
-        current_user = get_identity()
-        if current_user.role != Role.STUDENT:
-            return forbidden('Student access required')
-        return fn(*args, **kwargs)
+    route = get_route_name()
+    wait_time = rate_limiter.try_acquire(route, get_client_key())
+    if wait_time:
+        return too_many_requests('Rate limit exceeded.', wait_time)
 
-    return wrapper
+    if not admission_controller.try_admit(ROUTE_PRIORITIES.get(route, Priority.NORMAL)):
+        logger.warning(f'Shedding {request.endpoint}, in flight = {admission_controller.in_flight}')
+        return too_many_requests('Server is overloaded.', OVERLOAD_RETRY_AFTER_IN_SECONDS)
+    g.admitted = True
 
 
-@app.before_request
-def set_auth_token():
-    target_url = request.url
-    for url in WHITELISTED_URLS:
-        if target_url.endswith(url):
-            return
+@api.teardown_app_request
+def release_admission(error=None):
+    if g.pop('admitted', False):
+        admission_controller.release()
+
+
+def get_route_name():
+    return request.endpoint.rpartition('.')[2]
 
-    authz_header = request.headers.get('Authorization')
-    token = None
-    if authz_header and authz_header.startswith('Bearer '):
-        token = authz_header[len(BEARER):]
-    g.token = token
 
+def get_client_key():
+    if g.identity is not None:
+        # staff and students live in different tables, so the id alone does not identify a user
+        return f'user:{g.identity.role.value}:{g.identity.id}'
+    # the forwarded client address when behind trusted proxies (see PROXY_TRUSTED_HOPS)
+    address_key = f'address:{request.remote_addr}'
+    if get_route_name() == 'login':
+        data = request.get_json(silent=True)
+        identifier = data.get('identifier') if isinstance(data, dict) else None
+        if isinstance(identifier, str) and identifier:
+            return f'identifier:{identifier}:{address_key}'
+    return address_key
 
+
+# the identity is resolved once per request by authenticate()
 def get_identity() -> UserContext:
-    return auth_manager.get_user(g.token)
+    identity = g.identity
+    if identity is None:
+        raise UNAUTHORIZED
+    return identity
 
 
 # -----------------
 # ENVIRONMENTS #
-@app.route('/api/v1/environments', methods=['GET'])
+@api.route('/api/v1/environments', methods=['GET'])
 @auth_required
 def list_environments():
     logger.info("Received a request to list all environments")
@@ -125,7 +485,7 @@ def list_environments():
 
 # --------------------
 # COURSES
-@app.route('/api/v1/courses', methods=['GET'])
+@api.route('/api/v1/courses', methods=['GET'])
 @auth_required
 def list_courses():
     logger.info("Received a request to list all courses")
@@ -134,7 +494,7 @@ def list_courses():
 
 # # --------------------
 # EXAMS
-@app.route('/api/v1/courses/<int:course_id>/exams', methods=['GET'])
+@api.route('/api/v1/courses/<int:course_id>/exams', methods=['GET'])
 @auth_required
 def list_exams(course_id):
     # the only check atm, just check if the course exists since all exams will be under that course
@@ -163,15 +523,49 @@ def list_exams(course_id):
     return {'data': exam_representations}, 200
 
 
-@app.route('/api/v1/exams/<int:exam_id>', methods=['GET'])
+@api.route('/api/v1/exams/<int:exam_id>', methods=['GET'])
 @auth_required
 def get_exam(exam_id):
-    exam = exam_dao.find_by_id(exam_id)
+    exam = get_exam_representation(exam_id)
+    error = check_active_exam_access(exam_id, exam)
+    if error:
+        return error
+
+    return to_conditional_response(exam, request)
+
+
+# Exam, its assignments and the environments in one response, so the frontend needs a single round trip
+@api.route('/api/v1/exams/<int:exam_id>/bundle', methods=['GET'])
+@auth_required
+def get_exam_bundle(exam_id):
+    error = check_active_exam_access(exam_id, get_exam_representation(exam_id))
+    if error:
+        return error
+
+    bundle = exam_bundle_cache.get(exam_id)
+    if bundle is None:
+        exam = exam_dao.find_with_assignments(exam_id)
+        if not exam:
+            return not_found('Exam not found')
+
+        bundle = to_representation({
+            'exam': exam.to_dict(),
+            'assignments': [assignment.to_dict() for assignment in exam.assignments],
+            # environments are not bound to exams, every environment is allowed
+            'environments': [environment.to_dict() for environment in environment_dao.find_all()],
+        }, current_app.config['COMPRESSION_MIN_SIZE'])
+        if exam.status == 'ACTIVE':
+            exam_bundle_cache.put(exam_id, bundle)
+
+    return to_conditional_response(bundle, request)
+
+
+def check_active_exam_access(exam_id, exam):
     if not exam:
         return not_found('Exam not found')
 
     # Check if the exam is active
-    if exam.status != 'ACTIVE':
+    if exam.payload['status'] != 'ACTIVE':
         return conflict('Exam is not active')
 
     current_user = get_identity()
@@ -179,13 +573,22 @@ def get_exam(exam_id):
         student_id = current_user.id
         # Check if the student has started or completed the exam
         exam_completion = exam_completion_dao.find_by_exam_and_student(exam_id=exam_id, student_id=student_id)
-        if not exam_completion or exam_completion.status == 'COMPLETED':
+        if not exam_completion or exam_completion.completed:
             return conflict('Exam not active, no permission to access.')
 
-    return exam.to_dict(), 200
+
+def get_exam_representation(exam_id):
+    exam = exam_cache.get(exam_id)
+    if exam is None:
+        exam_entity = exam_dao.find_by_id(exam_id)
+        if not exam_entity:
+            return None
+        exam = to_representation(exam_entity.to_dict(), current_app.config['COMPRESSION_MIN_SIZE'])
+        exam_cache.put(exam_id, exam)
+    return exam
 
 
-@app.route('/api/v1/staff/exams/<int:exam_id>/start', methods=['POST'])
+@api.route('/api/v1/staff/exams/<int:exam_id>/start', methods=['POST'])
 @staff_required
 def start_exam(exam_id):
     exam = exam_dao.find_by_id(exam_id)
@@ -197,13 +600,16 @@ def start_exam(exam_id):
         return conflict('Exam is already active or completed')
 
     exam.status = 'ACTIVE'
+    exam.updated_at = datetime.utcnow()
     exam_dao.session_commit()
+    exam_scheduler.invalidate([exam_id])
+    exam_scheduler.warm_up([exam_id])
     return exam.to_dict(), 200
 
 
 # Endpoint for completing an exam
-@app.route('/api/v1/staff/exams/<int:exam_id>/complete', methods=['POST'])
-@student_required
+@api.route('/api/v1/staff/exams/<int:exam_id>/complete', methods=['POST'])
+@staff_required
 def complete_exam(exam_id):
     exam = exam_dao.find_by_id(exam_id)
     if not exam:
@@ -213,116 +619,314 @@ def complete_exam(exam_id):
     if exam.status != 'ACTIVE':
         return forbidden('Exam is not active')
 
-    exam.status = 'COMPLETE'
+    exam.status = 'COMPLETED'
+    # the exam archiver measures the retention from the completion
+    exam.updated_at = datetime.utcnow()
+    exam_dao.session_commit()
+    exam_scheduler.close_exams([exam_id])
+    return exam.to_dict(), 200
+
+
+# Endpoint for scheduling an exam, the exam scheduler starts and completes it at the given times
+@api.route('/api/v1/staff/exams/<int:exam_id>/schedule', methods=['PUT'])
+@staff_required
+def schedule_exam(exam_id):
+    exam = exam_dao.find_by_id(exam_id)
+    if not exam:
+        return not_found('Exam not found')
+
+    if exam.status == 'COMPLETED':
+        return conflict('Exam is already completed')
+
+    data = request.get_json() or {}
+    try:
+        start_at = parse_utc_datetime(data.get('start_at'))
+        end_at = parse_utc_datetime(data.get('end_at'))
+    except (TypeError, ValueError):
+        return bad_request('Invalid schedule, ISO 8601 timestamps expected.')
+
+    if start_at and end_at and end_at <= start_at:
+        return bad_request('Exam must end after it starts.')
+
+    exam.start_at = start_at
+    exam.end_at = end_at
+    exam.updated_at = datetime.utcnow()
     exam_dao.session_commit()
+    exam_scheduler.invalidate([exam_id])
     return exam.to_dict(), 200
 
 
 # # --------------------
 # STUDENT EXAMS
-@app.route('/api/v1/exams/<int:exam_id>/start', methods=['POST'])
+@api.route('/api/v1/exams/<int:exam_id>/start', methods=['POST'])
 @student_required
 def start_exam_as_student(exam_id):
-    exam = exam_dao.find_by_id(exam_id)
+    # served from the exam cache and the state of the student is checked by apply_exam_start, so a stalled database
+    # does not block the request
+    exam = get_exam_representation(exam_id)
     if not exam:
         return not_found('Exam not found')
 
     # Check if the exam is active
-    if exam.status != 'ACTIVE':
+    if exam.payload['status'] != 'ACTIVE':
         return conflict('Exam is not active')
 
-    student_id = get_identity().id
-    exam_completion = exam_completion_dao.find_by_exam_and_student(exam_id=exam_id, student_id=student_id)
-    if exam_completion:
-        return conflict('Exam already started')
-
-    exam_completion_dao.insert(ExamCompletion(exam_id, student_id))
-
-    return exam.to_dict(), 200
+    applied, rejection = journaled_write(EXAM_START, {'exam_id': exam_id, 'student_id': get_identity().id})
+    if rejection:
+        return error_response(*rejection)
+    return exam.payload, 200 if applied else 202
 
 
 # Endpoint for completing an exam
-@app.route('/api/v1/exams/<int:exam_id>/complete', methods=['POST'])
+@api.route('/api/v1/exams/<int:exam_id>/complete', methods=['POST'])
 @student_required
 def complete_exam_as_student(exam_id):
-    exam = exam_dao.find_by_id(exam_id)
+    # see start_exam_as_student, the state of the student is checked by apply_exam_complete
+    exam = get_exam_representation(exam_id)
     if not exam:
         return not_found('Exam not found')
 
     # Check if the exam is active
-    if exam.status != 'ACTIVE':
+    if exam.payload['status'] != 'ACTIVE':
         return forbidden('Exam is not active')
 
-    student_id = get_identity().id
-    exam_completion = exam_completion_dao.find_by_exam_and_student(exam_id=exam_id, student_id=student_id)
-    if not exam_completion:
-        return bad_request('Exam not started by the student')
-
-    if exam_completion.completed:
-        return conflict('Exam already completed')
-
-    exam_completion.completed = True
-    exam_completion_dao.session_commit()
-
-    return exam.to_dict(), 200
+    applied, rejection = journaled_write(EXAM_COMPLETE, {'exam_id': exam_id, 'student_id': get_identity().id})
+    if rejection:
+        return error_response(*rejection)
+    return exam.payload, 200 if applied else 202
 
 
 # Endpoint for completing an exam
-@app.route('/api/v1/exams/<int:exam_id>/violation', methods=['POST'])
+@api.route('/api/v1/exams/<int:exam_id>/violation', methods=['POST'])
 @student_required
 def report_exam_violation(exam_id):
-    exam = Exam.query.get(exam_id)
-    if not exam:
+    # served from the exam cache, so a stalled database does not block the report
+    if not get_exam_representation(exam_id):
         return not_found('Exam not found')
 
     data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return bad_request('Invalid violation.')
 
     assignment_id = data.get('assignment_id')
+    # stored in a string column, comparing it with an integer fails on Postgres
+    if isinstance(assignment_id, int) and not isinstance(assignment_id, bool):
+        assignment_id = str(assignment_id)
+    if assignment_id is not None and not isinstance(assignment_id, str):
+        return bad_request('Invalid assignment id.')
+
     violation_type = data.get('violation_type')
+    # a list or a dict is not hashable, the set lookup alone would fail
+    if not isinstance(violation_type, str) or violation_type not in VIOLATION_TYPES:
+        return bad_request('Unknown violation type.')
+
+    exam_violation = ExamViolation(exam_id, get_identity().id, assignment_id, violation_type)
+    applied, rejection = journaled_write(EXAM_VIOLATION, {
+        'exam_id': exam_violation.exam_id,
+        'student_id': exam_violation.student_id,
+        'assignment_id': exam_violation.assignment_id,
+        'violation_type': exam_violation.violation_type,
+        # the debounce window applies to the time of the event, not to when the record is replayed
+        'reported_at': time(),
+    })
+    if rejection:
+        return error_response(*rejection)
+    return exam_violation.to_dict(), 200 if applied else 202
 
-    student_id = get_identity().id
 
-    exam_violation = exam_violation_dao.insert(
-        ExamViolation(exam_id, student_id, assignment_id, violation_type)
-    )
+# --------------------
+# JOURNALED WRITES
+# Writes that must not be lost or block while the database stalls. They are appended to the local journal first and
+# applied in order, right away while the database keeps up. Applying a record again has no effect.
+EXAM_VIOLATION = 'exam_violation'
+EXAM_START = 'exam_start'
+EXAM_COMPLETE = 'exam_complete'
+
+
+# (True, rejection) when the write is already in the database, (False, None) when it is only durable in the journal.
+# A rejection is the (message, status code) of a write that had no effect given the state of the student.
+def journaled_write(record_type, data):
+    if not current_app.config['JOURNAL_DIR']:
+        return True, JOURNALED_WRITES[record_type](None, data)
+    return journal_replayer.submit(record_type, data)
+
+
+def apply_exam_violation(key, data):
+    if key is None or not exam_violation_dao.exists_by_journal_key(data['exam_id'], key):
+        # records journaled before the assignment id was validated may hold an integer
+        assignment_id = str(data['assignment_id']) if data['assignment_id'] is not None else None
+        violation_key = (data['exam_id'], data['student_id'], assignment_id, data['violation_type'])
+        # records journaled before debouncing have no reported_at
+        reported_at = data.get('reported_at') or time()
+        occurred_at = datetime.utcfromtimestamp(reported_at)
+
+        # a repeated event is one more occurrence of the counted violation, the count and the limit are unchanged
+        violation_id = violation_debouncer.find(violation_key, reported_at)
+        if violation_id is not None and exam_violation_dao.add_occurrence(data['exam_id'], violation_id, occurred_at):
+            return
+
+        exam_violation = ExamViolation(data['exam_id'], data['student_id'], assignment_id, data['violation_type'])
+        exam_violation.journal_key = key
+        exam_violation.created_at = exam_violation.updated_at = occurred_at
+        num_of_exam_violations = exam_violation_dao.insert_with_summary(exam_violation)
+        violation_debouncer.record(violation_key, exam_violation.id, reported_at)
+    else:
+        num_of_exam_violations = exam_violation_dao.count_summarized_violations(data['student_id'], data['exam_id'])
 
-    num_of_exam_violations = exam_violation_dao.count_exam_violations(student_id, assignment_id)
     # if violations limit reached, complete the exam for this user
-    if num_of_exam_violations >= violations_limit_per_exam:
-        exam_completion_dao.insert(
-            ExamCompletion(exam_id, student_id, True, "Course policy violated")
-        )
+    if num_of_exam_violations >= current_app.config['VIOLATIONS_LIMIT_PER_EXAM']:
+        complete_exam_for_violations(data['exam_id'], data['student_id'])
+
+
+# (violation id, reported at) for the shared debounce index
+def find_recent_violation(violation_key, since):
+    recent = exam_violation_dao.find_recent(*violation_key, datetime.utcfromtimestamp(since))
+    if recent is None:
+        return None
+    return recent.id, recent.created_at.replace(tzinfo=timezone.utc).timestamp()
+
+
+def apply_exam_start(key, data):
+    if exam_completion_dao.find_by_exam_and_student(exam_id=data['exam_id'], student_id=data['student_id']):
+        return 'Exam already started', 409
+    exam_completion_dao.insert(ExamCompletion(data['exam_id'], data['student_id']))
+
+
+def apply_exam_complete(key, data):
+    exam_completion = exam_completion_dao.find_by_exam_and_student(exam_id=data['exam_id'],
+                                                                   student_id=data['student_id'])
+    if not exam_completion:
+        return 'Exam not started by the student', 400
+    if exam_completion.completed:
+        return 'Exam already completed', 409
+    exam_completion.completed = True
+    exam_completion_dao.session_commit()
+
+
+JOURNALED_WRITES = {
+    EXAM_VIOLATION: apply_exam_violation,
+    EXAM_START: apply_exam_start,
+    EXAM_COMPLETE: apply_exam_complete,
+}
+
+
+@api.route('/api/v1/staff/journal', methods=['GET'])
+@staff_required
+def get_journal_lag():
+    if not current_app.config['JOURNAL_DIR']:
+        return not_found('Journal is disabled')
+    return {'data': journal_replayer.lag()}, 200
+
+
+def complete_exam_for_violations(exam_id, student_id):
+    exam_completion = exam_completion_dao.find_by_exam_and_student(exam_id=exam_id, student_id=student_id)
+    if not exam_completion:
+        exam_completion_dao.insert(ExamCompletion(exam_id, student_id, True, POLICY_VIOLATED_REASON))
+    elif not exam_completion.completed:
+        exam_completion.completed = True
+        exam_completion.completion_reason = POLICY_VIOLATED_REASON
+        exam_completion_dao.session_commit()
 
-    return exam_violation.to_dict(), 200
+
+# Proctor dashboard, reads only the violation counters
+@api.route('/api/v1/staff/exams/<int:exam_id>/violations/analytics', methods=['GET'])
+@staff_required
+def get_violation_analytics(exam_id):
+    near_limit_margin = request.args.get('near_limit_margin', 1, type=int)
+    return {
+               'data': to_violation_analytics(exam_id, exam_violation_dao.find_summary_by_exam(exam_id),
+                                              current_app.config['VIOLATIONS_LIMIT_PER_EXAM'], near_limit_margin)
+           }, 200
+
+
+# Post exam reports, ?format=csv (default) or ndjson, archived rows included
+@api.route('/api/v1/staff/exams/<int:exam_id>/completions/export', methods=['GET'])
+@staff_required
+def export_exam_completions(exam_id):
+    return export_exam_rows(exam_id, 'completions', COMPLETION_EXPORT_COLUMNS, exam_completion_dao)
+
+
+@api.route('/api/v1/staff/exams/<int:exam_id>/violations/export', methods=['GET'])
+@staff_required
+def export_exam_violations(exam_id):
+    return export_exam_rows(exam_id, 'violations', VIOLATION_EXPORT_COLUMNS, exam_violation_dao)
+
+
+def export_exam_rows(exam_id, report, column_names, dao):
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return bad_request(f'Unsupported export format, expected one of {", ".join(EXPORT_FORMATS)}.')
+    if get_exam_representation(exam_id) is None:
+        return not_found('Exam not found')
+
+    mimetype, encode = EXPORT_FORMATS[export_format]
+    # the rows are read while streaming, so the request context (and its DB session) is kept until the last chunk
+    chunks = encode(column_names, dao.stream_by_exam(exam_id, column_names))
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=exam_{exam_id}_{report}.{export_format}',
+        'X-Accel-Buffering': 'no',
+    })
 
 
 # --------------------
 # ASSIGNMENTS
-@app.route('/api/v1/exams/<int:exam_id>/assignments/<int:assignment_id>', methods=['GET'])
+@api.route('/api/v1/exams/<int:exam_id>/assignments/<int:assignment_id>', methods=['GET'])
 @auth_required
 def get_assignment(exam_id, assignment_id):
-    check_exam_access(exam_id)
+    # the exam comes from the exam cache, only the student's completion is read from the database
+    error = check_active_exam_access(exam_id, get_exam_representation(exam_id))
+    if error:
+        return error
 
-    assignment = assignment_dao.find_by_id(assignment_id)
-    if assignment.exam_id != exam_id:
+    assignment = get_exam_assignments(exam_id).get(assignment_id)
+    if not assignment:
         return forbidden('Assignment is not associated to target exam.')
 
-    return assignment.to_dict(), 200
+    # a matching If-None-Match is answered with 304 straight from the cache
+    return to_conditional_response(assignment, request)
+
+
+def get_exam_assignments(exam_id):
+    # warmed up by the exam scheduler before the exam starts
+    assignments = assignment_cache.get(exam_id)
+    if assignments is None:
+        assignments = load_exam_assignments(exam_id)
+        assignment_cache.put(exam_id, assignments)
+    return assignments
 
 
 # --------------------
 # SUBMISSIONS
-@app.route('/api/v1/exams/<int:exam_id>/assignments/<int:assignment_id>/submit', methods=['GET'])
+# GET is kept for the existing clients, POST is preferred
+@api.route('/api/v1/exams/<int:exam_id>/assignments/<int:assignment_id>/submit', methods=['GET', 'POST'])
 @auth_required
 def submit(exam_id, assignment_id):
-    data = request.get_json() or {}
+    # the size is enforced before anything is buffered, a missing Content-Length is bounded by the read limit
+    max_submission_size = current_app.config['MAX_SUBMISSION_SIZE']
+    if request.content_length is not None and request.content_length > max_submission_size:
+        return payload_too_large('Code submission is too large.')
+
+    body = request.stream.read(max_submission_size + 1)
+    if len(body) > max_submission_size:
+        return payload_too_large('Code submission is too large.')
+
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        return bad_request('Code submission is invalid.')
+    del body
+    if not isinstance(data, dict):
+        return bad_request('Code submission is invalid.')
+
     environment = data.get('environment')
     content = data.get('content')
 
     if not environment or not content:
         return bad_request('Code submission is invalid.')
 
-    check_exam_access(exam_id)
+    error = check_exam_access_by_id(exam_id)
+    if error:
+        return error
 
     assignment = assignment_dao.find_by_id(assignment_id)
     if not assignment:
@@ -331,47 +935,144 @@ def submit(exam_id, assignment_id):
     if assignment.exam_id != exam_id:
         return forbidden('Assignment is not associated to target exam.')
 
-    return {
-               'data': minerva_client.submit(assignment_id, assignment.name, environment, exam_id, content,
-                                             get_identity().id)
-           }, 202
+    user = get_identity()
+    submission = minerva_client.submit(assignment_id, assignment.name, environment, exam_id, content, user.id)
+    submission_notifier.watch(exam_id, user, submission)
+    return {'data': submission}, 202
 
 
-@app.route('/api/v1/exams/<int:exam_id>/submissions', methods=['GET'])
+@api.route('/api/v1/exams/<int:exam_id>/submissions', methods=['GET'])
 @auth_required
 def list_submissions(exam_id):
-    check_exam_access_by_id(exam_id)
+    error = check_exam_access_by_id(exam_id)
+    if error:
+        return error
     return {'data': minerva_client.list_my_submissions(exam_id, 0, 50, get_identity().id)}, 200
 
 
-@app.route('/api/v1/exams/<int:exam_id>/results', methods=['GET'])
+@api.route('/api/v1/exams/<int:exam_id>/results', methods=['GET'])
 @auth_required
 def get_exam_results(exam_id):
-    check_exam_access_by_id(exam_id)
-    return {'data': minerva_client.list_my_submissions(exam_id, 0, 50, get_identity().id)}, 200
+    error = check_exam_access_by_id(exam_id)
+    if error:
+        return error
+    user = get_identity()
+    # students get their live submissions, the scoreboard only knows the gradings seen by some worker's notifier until
+    # staff rebuild it
+    if user.role != Role.STAFF:
+        return {'data': minerva_client.list_my_submissions(exam_id, 0, 50, user.id)}, 200
+    # staff get the whole exam from the materialized scoreboard
+    return {'data': to_scoreboard(exam_id, exam_result_dao.find_by_exam(exam_id))}, 200
+
+
+# Rebuilds the scoreboard of an exam from all the submissions stored in Minerva
+@api.route('/api/v1/staff/exams/<int:exam_id>/results/aggregate', methods=['POST'])
+@staff_required
+def aggregate_exam_results(exam_id):
+    exam = exam_dao.find_by_id(exam_id)
+    if not exam:
+        return not_found('Exam not found')
+
+    summary = exam_results_aggregator.aggregate(exam_id)
+    return {'data': {**summary, **to_scoreboard(exam_id, exam_result_dao.find_by_exam(exam_id))}}, 200
 
 
-@app.route('/api/v1/submissions', methods=['GET'])
+@api.route('/api/v1/submissions', methods=['GET'])
 @staff_required
 def list_all_submissions():
     return {'data': minerva_client.list_all_submissions(0, 50, get_identity().id)}, 200
 
 
-@app.route('/api/v1/exams/<int:exam_id>/submissions/<int:submission_id>', methods=['GET'])
+@api.route('/api/v1/exams/<int:exam_id>/submissions/<int:submission_id>', methods=['GET'])
 @auth_required
 def get_submission(exam_id, submission_id):
-    check_exam_access_by_id(exam_id)
-    return {'data': minerva_client.get_submission(submission_id, get_identity().id)}, 200
+    error = check_exam_access_by_id(exam_id)
+    if error:
+        return error
+    user = get_identity()
+    # graded submissions do not change anymore, no need to ask Minerva again
+    submission = submission_notifier.get_graded(exam_id, submission_id, user)
+    if submission is None:
+        submission = minerva_client.get_submission(submission_id, user.id)
+    return {'data': submission}, 200
+
+
+# Server-sent events stream of the caller's submission status changes, replaces polling of get_submission
+@api.route('/api/v1/exams/<int:exam_id>/submissions/events', methods=['GET'])
+@auth_required
+def stream_submission_events(exam_id):
+    error = check_exam_access_by_id(exam_id)
+    if error:
+        return error
+    user = get_identity()
+    # the generator runs without an app context, so it holds on to the notifier itself rather than the proxy
+    notifier = get_services().submission_notifier
+    # the submissions may have been accepted by another worker, any worker can serve the stream once it watches them
+    try:
+        notifier.resume(exam_id, user, minerva_client.get_exam_results(exam_id, user.id))
+    except HogwartsException as e:
+        logger.warning(f'Failed to load the submissions of exam {exam_id} for user {user.id}: {e.message}')
+    queue = notifier.subscribe(exam_id, user)
+
+    def generate():
+        try:
+            for submission in notifier.snapshot(exam_id, user):
+                yield to_submission_event(submission)
+
+            while True:
+                submission = notifier.listen(queue, SUBMISSION_EVENTS_KEEP_ALIVE_IN_SECONDS)
+                yield to_submission_event(submission) if submission is not None else ': keep-alive\n\n'
+        finally:
+            notifier.unsubscribe(exam_id, user, queue)
 
+    # the generator does not need the request context, so the DB session is released before streaming starts
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-@app.route('/api/v1/assignments/<int:assignment_id>/allowance', methods=['GET'])
+
+# Minerva pushes grading status changes here, the secret is shared through the configuration
+@api.route('/api/v1/minerva/submissions/callback', methods=['POST'])
+@public
+def minerva_submission_callback():
+    secret = request.headers.get(MINERVA_CALLBACK_SECRET_HEADER, '')
+    minerva_callback_secret = current_app.config['MINERVA_CALLBACK_SECRET']
+    if not minerva_callback_secret or not compare_digest(secret, minerva_callback_secret):
+        return unauthorized()
+
+    submission = request.get_json() or {}
+    if 'id' not in submission:
+        return bad_request('Submission id is missing.')
+
+    submission_notifier.update(submission)
+    return '', 204
+
+
+#### Health
+# The process is up, restarting it would not help with a failing dependency
+@api.route('/api/v1/health/live', methods=['GET'])
+@public
+def get_liveness():
+    return {'status': 'UP'}, 200
+
+
+# Whether the load balancer should send traffic to this worker
+@api.route('/api/v1/health/ready', methods=['GET'])
+@public
+def get_readiness():
+    readiness = health_monitor.readiness()
+    return readiness, 200 if readiness['status'] == 'READY' else 503
+
+
+@api.route('/api/v1/assignments/<int:assignment_id>/allowance', methods=['GET'])
 @auth_required
 def get_submission_allowance(assignment_id):
     assignment = assignment_dao.find_by_id(assignment_id)
     if not assignment:
         return not_found("Assignment not found.")
 
-    check_exam_access(assignment.exam)
+    error = check_exam_access(assignment.exam)
+    if error:
+        return error
     return {'data': minerva_client.get_allowance(assignment_id, get_identity().id)}, 200
 
 
@@ -396,6 +1097,15 @@ def check_exam_access(exam):
             return forbidden('Exam not active, no permission to access.')
 
 
+def parse_utc_datetime(value):
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
 def to_list_response(resource, collection):
     return {
         "data": {
@@ -406,14 +1116,22 @@ def to_list_response(resource, collection):
     }
 
 
+def to_submission_event(submission):
+    return f'event: submission\ndata: {json.dumps(submission)}\n\n'
+
+
 def to_response(entity):
     return {
         "data": entity.to_dict()
     }
 
 
-@app.errorhandler(Exception)
+@api.app_errorhandler(Exception)
 def handle_error(error):
+    # Flask's own errors (404, 405, malformed JSON...) keep their status code
+    if isinstance(error, HTTPException):
+        return {'error': error.description}, error.code
+
     logger.error(f'An error occurred: {error}')
     if isinstance(error, HogwartsException):
         return {'error': error.message}, error.status
@@ -433,6 +1151,16 @@ def forbidden(message):
     return error_response(message, 403)
 
 
+def payload_too_large(message):
+    return error_response(message, 413)
+
+
+def too_many_requests(message, retry_after_in_seconds):
+    response, status_code = error_response(message, 429)
+    response.headers['Retry-After'] = str(retry_after_in_seconds)
+    return response, status_code
+
+
 def not_found(message):
     return error_response(message, 404)
 
@@ -445,7 +1173,16 @@ def error_response(message, status_code):
     return jsonify({'error': message}), status_code
 
 
+@api.before_app_first_request
+def start_background_jobs():
+    exam_scheduler.start()
+    health_monitor.start_warm_up()
+    if current_app.config['JOURNAL_DIR']:
+        journal_replayer.start()
+
+
 if __name__ == "__main__":
-    with app.app_context() as context:
+    app = create_app()
+    with app.app_context():
         db.create_all()
     app.run()
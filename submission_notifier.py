@@ -0,0 +1,174 @@
+from collections import defaultdict
+from queue import Queue, Full, Empty
+from threading import Lock, Thread, Event
+
+from exception import HogwartsException
+from util.logging import logger
+
+PENDING_STATUSES = ['PENDING', 'QUEUED', 'RUNNING', 'IN_PROGRESS']
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+# Keeps track of the submissions Minerva is still grading and fans their status changes out to the subscribers.
+# A single background poller asks Minerva only about pending submissions (Minerva can also push the changes through
+# the callback endpoint), so the number of waiting clients does not translate into upstream calls.
+# Graded submissions are only kept in the given cache, so they expire instead of piling up for the life of the worker.
+class SubmissionNotifier:
+    def __init__(self, minerva_client, poll_interval_in_seconds, graded_cache):
+        self._minerva_client = minerva_client
+        self._poll_interval_in_seconds = poll_interval_in_seconds
+        self._lock = Lock()
+        # submission id -> (exam id, user, latest known submission representation), pending submissions only
+        self._submissions = {}
+        # (exam id, user key) -> {submission id -> graded submission representation}
+        self._graded = graded_cache
+        self._pending_submission_ids = set()
+        # (exam id, user key) -> subscriber queues
+        self._subscribers = defaultdict(list)
+        # called with (exam id, user, submission) once a submission is no longer pending
+        self._listeners = []
+        self._poller = None
+        self._stopped = Event()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def watch(self, exam_id, user, submission):
+        with self._lock:
+            if _is_pending(submission):
+                self._submissions[submission['id']] = (exam_id, user, submission)
+                self._pending_submission_ids.add(submission['id'])
+            else:
+                self._put_graded(exam_id, user, submission)
+        self._publish(exam_id, user, submission)
+        if _is_pending(submission):
+            self._ensure_poller_started()
+        else:
+            self._notify_listeners(exam_id, user, submission)
+
+    # Takes over the user's submissions fetched from Minerva, e.g. submitted through another worker or before a restart.
+    # The pending ones are polled from now on, nothing is published since the subscriber starts from a snapshot.
+    def resume(self, exam_id, user, submissions):
+        has_pending = False
+        with self._lock:
+            graded = self._graded.get((exam_id, _user_key(user))) or {}
+            for submission in submissions:
+                if submission['id'] in self._submissions or submission['id'] in graded:
+                    continue
+                if _is_pending(submission):
+                    self._submissions[submission['id']] = (exam_id, user, submission)
+                    self._pending_submission_ids.add(submission['id'])
+                    has_pending = True
+                else:
+                    self._put_graded(exam_id, user, submission)
+        if has_pending:
+            self._ensure_poller_started()
+
+    def update(self, submission):
+        with self._lock:
+            watched = self._submissions.get(submission.get('id'))
+            if not watched:
+                return False
+            exam_id, user, previous = watched
+            if _is_pending(submission):
+                self._submissions[submission['id']] = (exam_id, user, submission)
+            else:
+                # graded submissions do not change anymore, a later update of it is ignored
+                del self._submissions[submission['id']]
+                self._pending_submission_ids.discard(submission['id'])
+                self._put_graded(exam_id, user, submission)
+
+        if previous.get('status') != submission.get('status'):
+            self._publish(exam_id, user, submission)
+            if _is_pending(previous) and not _is_pending(submission):
+                self._notify_listeners(exam_id, user, submission)
+        return True
+
+    def get_graded(self, exam_id, submission_id, user):
+        with self._lock:
+            return (self._graded.get((exam_id, _user_key(user))) or {}).get(submission_id)
+
+    def snapshot(self, exam_id, user):
+        with self._lock:
+            pending = [submission for watched_exam_id, watched_user, submission in self._submissions.values()
+                       if watched_exam_id == exam_id and _user_key(watched_user) == _user_key(user)]
+            return pending + list((self._graded.get((exam_id, _user_key(user))) or {}).values())
+
+    def subscribe(self, exam_id, user):
+        queue = Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[(exam_id, _user_key(user))].append(queue)
+        return queue
+
+    def unsubscribe(self, exam_id, user, queue):
+        key = (exam_id, _user_key(user))
+        with self._lock:
+            queues = self._subscribers.get(key, [])
+            if queue in queues:
+                queues.remove(queue)
+            if not queues:
+                self._subscribers.pop(key, None)
+
+    def listen(self, queue, timeout_in_seconds):
+        try:
+            return queue.get(timeout=timeout_in_seconds)
+        except Empty:
+            return None
+
+    def stop(self):
+        self._stopped.set()
+
+    # called with the lock held
+    def _put_graded(self, exam_id, user, submission):
+        key = (exam_id, _user_key(user))
+        graded = self._graded.get(key) or {}
+        graded[submission['id']] = submission
+        self._graded.put(key, graded)
+
+    def _publish(self, exam_id, user, submission):
+        with self._lock:
+            queues = list(self._subscribers.get((exam_id, _user_key(user)), []))
+
+        for queue in queues:
+            try:
+                queue.put_nowait(submission)
+            except Full:
+                # a client that does not read its stream must not block the others
+                logger.warning(f'Dropping submission event for a slow subscriber: exam = {exam_id}, user = {user.id}')
+
+    def _notify_listeners(self, exam_id, user, submission):
+        for listener in self._listeners:
+            try:
+                listener(exam_id, user, submission)
+            except Exception as e:
+                logger.error(f'Submission listener failed for submission {submission.get("id")}: {e}')
+
+    def _ensure_poller_started(self):
+        with self._lock:
+            if self._poller is not None and self._poller.is_alive():
+                return
+            self._poller = Thread(target=self._poll, name='submission-notifier', daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        while not self._stopped.wait(self._poll_interval_in_seconds):
+            with self._lock:
+                pending = [(submission_id, self._submissions[submission_id][1])
+                           for submission_id in self._pending_submission_ids]
+
+            for submission_id, user in pending:
+                try:
+                    self.update(self._minerva_client.get_submission(submission_id, user.id))
+                except HogwartsException as e:
+                    logger.warning(f'Failed to refresh submission {submission_id}: {e.message}')
+                except Exception as e:
+                    logger.error(f'Failed to refresh submission {submission_id}: {e}')
+
+
+# staff and students live in different tables, so the id alone does not identify a user
+def _user_key(user):
+    return user.role, user.id
+
+
+def _is_pending(submission):
+    return submission.get('status') in PENDING_STATUSES
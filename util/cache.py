@@ -0,0 +1,38 @@
+from threading import Lock
+from time import monotonic
+
+
+# Small in-process cache with a per entry TTL, once full the oldest entries are evicted first
+class Cache:
+    def __init__(self, ttl_in_seconds, max_size):
+        self._ttl_in_seconds = ttl_in_seconds
+        self._max_size = max_size
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self._max_size:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (value, monotonic() + self._ttl_in_seconds)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,59 @@
+import gzip
+import json
+from dataclasses import dataclass, field
+from hashlib import sha256
+from typing import Dict
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    # brotli is optional, gzip is always available
+    brotli = None
+
+CACHE_CONTROL = 'private, no-cache'
+
+
+# A serialized JSON payload with its strong ETag and the pre-compressed variants of the body
+@dataclass(frozen=True)
+class Representation:
+    body: bytes
+    etag: str
+    payload: dict
+    encoded_bodies: Dict[str, bytes] = field(default_factory=dict)
+
+
+def to_representation(payload, min_compression_size):
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    encoded_bodies = {}
+    if len(body) >= min_compression_size:
+        encoded_bodies['gzip'] = gzip.compress(body)
+        if brotli is not None:
+            encoded_bodies['br'] = brotli.compress(body)
+
+    return Representation(body, sha256(body).hexdigest()[:32], payload, encoded_bodies)
+
+
+def to_conditional_response(representation, request, status=200):
+    if request.if_none_match.contains(representation.etag):
+        response = Response(status=304)
+    else:
+        encoding = _choose_encoding(representation, request)
+        body = representation.encoded_bodies[encoding] if encoding else representation.body
+        response = Response(body, status=status, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(representation.etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _choose_encoding(representation, request):
+    # preferred encodings first
+    for encoding in ('br', 'gzip'):
+        if encoding in representation.encoded_bodies and request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
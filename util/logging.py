@@ -1,6 +1,10 @@
 import logging
 
-logging.basicConfig(level=logging.DEBUG, filename="app.log",
-                    format='%(asctime)s: %(levelname)s - %(message)s',
-                    datefmt='%m/%d/%Y %I:%M:%S %p')
 logger = logging
+
+
+# called by create_app(), importing a module does not open the log file
+def configure_logging(filename):
+    logging.basicConfig(level=logging.DEBUG, filename=filename,
+                        format='%(asctime)s: %(levelname)s - %(message)s',
+                        datefmt='%m/%d/%Y %I:%M:%S %p')
@@ -1,12 +1,21 @@
 import secrets
+from math import floor, log2
+from statistics import median
+from time import perf_counter
 
 import bcrypt
 
 PASSWORD_LENGTH = 10
 
+# bcrypt's own default, until a calibrated cost is configured
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+CALIBRATION_PASSWORD = b'calibration-password'
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(bytes(password, encoding='utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def hash_password(password: str, rounds=DEFAULT_ROUNDS) -> str:
+    return bcrypt.hashpw(bytes(password, encoding='utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
 
 
 def generate_password(hashed=True) -> str:
@@ -18,5 +27,35 @@ def password_matches(plain: str, hashed: str):
     return bcrypt.checkpw(_to_bytes(plain), _to_bytes(hashed))
 
 
+# the cost factor is stored in the hash itself, $2b$<rounds>$<salt and hash>
+def get_rounds(hashed: str):
+    return int(hashed.split('$')[2])
+
+
+def needs_rehash(hashed: str, rounds):
+    return get_rounds(hashed) != rounds
+
+
+# The highest cost whose verification stays within the target on this machine. Every extra round doubles the work,
+# so the cost is extrapolated from the cheapest one and then checked.
+def calibrate_rounds(target_seconds, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS):
+    base_seconds = measure_verify_seconds(min_rounds)
+    rounds = min_rounds + floor(log2(target_seconds / base_seconds)) if target_seconds > base_seconds else min_rounds
+    rounds = max(min_rounds, min(rounds, max_rounds))
+    while rounds > min_rounds and measure_verify_seconds(rounds) > target_seconds:
+        rounds -= 1
+    return rounds
+
+
+def measure_verify_seconds(rounds, samples=3):
+    hashed = bcrypt.hashpw(CALIBRATION_PASSWORD, bcrypt.gensalt(rounds))
+    timings = []
+    for _ in range(samples):
+        started = perf_counter()
+        bcrypt.checkpw(CALIBRATION_PASSWORD, hashed)
+        timings.append(perf_counter() - started)
+    return median(timings)
+
+
 def _to_bytes(password: str):
     return password.encode('utf-8')
@@ -0,0 +1,31 @@
+from collections import Counter, defaultdict
+
+
+# Proctor views over the per exam violation counters (ExamViolationSummary rows of a single exam)
+def to_violation_analytics(exam_id, summaries, violations_limit, near_limit_margin):
+    by_type = Counter()
+    by_assignment = Counter()
+    by_student = defaultdict(Counter)
+
+    for summary in summaries:
+        by_type[summary.violation_type] += summary.count
+        if summary.assignment_id:
+            by_assignment[summary.assignment_id] += summary.count
+        by_student[summary.student_id][summary.violation_type] += summary.count
+
+    students = sorted(({
+        'student_id': student_id,
+        'total': sum(counts.values()),
+        'by_type': dict(counts),
+    } for student_id, counts in by_student.items()), key=lambda student: student['total'], reverse=True)
+
+    return {
+        'exam_id': exam_id,
+        'total': sum(by_type.values()),
+        'violations_limit': violations_limit,
+        'by_type': dict(by_type),
+        'by_assignment': dict(by_assignment),
+        'by_student': students,
+        'near_limit': [{'student_id': student['student_id'], 'total': student['total']} for student in students
+                       if student['total'] >= violations_limit - near_limit_margin],
+    }
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+# Index of the recently recorded violations, one user action in the browser fires a burst of identical events that
+# should count as a single violation. Keyed by (exam id, student id, assignment id, violation type), an event within
+# the window of the recorded violation is a repeat of it. The window starts at the first event, so a long burst
+# still counts once per window.
+class ViolationDebouncer:
+    def __init__(self, window_in_seconds, max_keys, find_recent=None):
+        self._window_in_seconds = window_in_seconds
+        self._max_keys = max_keys
+        # optional fn(key, since) -> (violation id, reported at) or None, shares the index across the workers
+        # through the database when the in-process index misses
+        self._find_recent = find_recent
+        # key -> (violation id, reported at), the oldest first
+        self._recent = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        return self._window_in_seconds > 0
+
+    # id of the violation the event repeats, None when the event is a new violation
+    def find(self, key, reported_at):
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            recent = self._recent.get(key)
+        if recent is None and self._find_recent is not None:
+            recent = self._find_recent(key, reported_at - self._window_in_seconds)
+            if recent is not None:
+                self.record(key, *recent)
+
+        if recent is None or not 0 <= reported_at - recent[1] < self._window_in_seconds:
+            return None
+        return recent[0]
+
+    def record(self, key, violation_id, reported_at):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._recent.pop(key, None)
+            while len(self._recent) >= self._max_keys:
+                self._recent.popitem(last=False)
+            self._recent[key] = (violation_id, reported_at)